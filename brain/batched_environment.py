@@ -0,0 +1,300 @@
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode
+from gymnasium.vector.utils import batch_space
+from engine.batched_player import BatchedPlayerSim, mixed_op
+from engine.macro import macro_writer, MACRO_FRAME_DTYPE
+from engine.ground_field import GroundField
+from engine.level import Level, LandingMode
+from engine.observation import OBSERVATION_SIZE, BLOCKAGE_RAY_SLICE, GROUND_RAY_SLICE, GROUND_DISTANCE, FACING, VELOCITY
+from engine.player import Player
+from engine.start_states import StartStatePool, START_STATE_DTYPE
+from engine.spectator import SpectatorPublisher, get_spectator_name
+from engine.constants import *
+from numpy import float32 as fl
+import math
+
+class BatchedEnvironment(gym.vector.VectorEnv):
+    # num_envs copies of Environment stepped together in one process: one shared Level, one
+    # BatchedPlayerSim, and observations, rewards and dones as arrays. Episodes that end are
+    # reset within the same step; their last observation is in infos["final_obs"].
+    metadata = {'render.modes': [], 'autoreset_mode': AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs: int, level: Level = None, ground_field: bool = GROUND_FIELD, spectate: int = 0,
+                 blockage_rays: bool = BLOCKAGE_RAYS, start_states: bool = START_STATE_POOL,
+                 record_macros: bool = RECORD_MACROS):
+        self.num_envs = num_envs
+        self.level = level if level is not None else Level()
+        self.sim = BatchedPlayerSim(self.level, num_envs)
+
+        # Same spaces as Environment
+        self.single_action_space = spaces.Box(
+            low=np.array([0., 0., 0., 0., 0., 0., -180.0], dtype=np.float32),
+            high=np.array([1., 1., 1., 1., 1., 1., 180.0], dtype=np.float32),
+            dtype=np.float32
+        )
+        self.single_observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(OBSERVATION_SIZE,), dtype=np.float32)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        ray_angles = [(i / RAYCAST_NUMBER) * 2 * math.pi for i in range(RAYCAST_NUMBER)]
+        self.ray_dir_x = np.array([math.cos(angle) for angle in ray_angles])
+        self.ray_dir_z = np.array([math.sin(angle) for angle in ray_angles])
+
+        # ground_field False raycasts every ground ray, which matches Environment bit for bit.
+        # Blockage rays are only cast with blockage_rays, otherwise their slots stay zero.
+        self.blockage_rays = blockage_rays
+        self.ground_field = None
+        if ground_field:
+            self.ground_field = GroundField.load(self.level, self.ray_dir_x, self.ray_dir_z, 1.25)
+
+        start_x, _, start_z = self.level.get_start_bounds().get_center()
+        self.invert_x = not self.level.goal_x < start_x
+        self.invert_z = not self.level.goal_z > start_z
+
+        self.max_steps = 150
+        self.current_step = np.zeros(num_envs, dtype=np.int64)
+        self.total_offset = np.full(num_envs, -999.0)
+        self.total_reward = np.zeros(num_envs)
+
+        # Macro frames of the running episodes, rendered to CSV rows only when one is saved. With
+        # record_macros False nothing is recorded and no macro is saved.
+        self.macro_length = np.zeros(num_envs, dtype=np.int64)
+        self.macro_frames = np.zeros((num_envs, self.max_steps + 1), dtype=MACRO_FRAME_DTYPE)
+        self.record_macros = record_macros
+        self.prev_facing = np.zeros(num_envs, dtype=fl)
+
+        # With start_states, envs reset to states from a shared StartStatePool, see Environment
+        self.start_states = None
+        self.env_start_states = np.zeros(num_envs, dtype=START_STATE_DTYPE)
+        if start_states:
+            self.start_states = StartStatePool(self.level)
+
+        # One training run: attempts, landings and the PB are counted across all envs
+        self.attempt_until_macro = 0
+        self.macro_n = 39
+        self.best_offset = -999.0
+        self.landed_n = 0
+
+        # The first spectate envs publish to the rings of workers 0..spectate-1
+        self.spectators = [SpectatorPublisher(get_spectator_name(i), self.level.path) for i in range(min(spectate, num_envs))]
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+
+        self.reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.get_observations(np.arange(self.num_envs)), {}
+
+    def reset_envs(self, mask: np.ndarray):
+        # Same as Engine.reset, NaN prev_slip standing for Player's None
+        sim = self.sim
+        if self.start_states is None:
+            sim.set_position(mask=mask)
+            sim.prev_slip[mask] = np.nan
+            sim.prev_sprint[mask] = False
+            sim.jump_height[mask] = sim.y[mask]
+            self.prev_facing[mask] = Player.start_f
+        else:
+            states = self.start_states.sample_batch(int(np.count_nonzero(mask)))
+            position, velocity = states["position"], states["velocity"]
+            sim.set_position(position[:, 0], position[:, 1], position[:, 2], states["facing"], mask=mask)
+            sim.vx[mask], sim.vy[mask], sim.vz[mask] = velocity[:, 0], velocity[:, 1], velocity[:, 2]
+            sim.prev_slip[mask] = states["prev_slip"]
+            sim.prev_sprint[mask] = states["prev_sprint"]
+            sim.jump_height[mask] = states["jump_height"]
+            self.prev_facing[mask] = states["facing"]
+            self.env_start_states[mask] = states
+        self.total_offset[mask] = -999.0
+        self.current_step[mask] = 0
+        self.macro_length[mask] = 0
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, -1)
+        sim = self.sim
+        self.current_step += 1
+
+        pressed = actions[:, :6] > 0.5
+        sim.turn(actions[:, 6])
+        sim.set_movement(pressed[:, 0], pressed[:, 1], pressed[:, 2], pressed[:, 3], pressed[:, 4], pressed[:, 5])
+
+        # Z_NEO measures from the position before the tick
+        prev_z_f32 = sim.z_f32.copy()
+        sim.tick()
+        self.record_macro_frames(pressed)
+        self.check_offsets(prev_z_f32)
+
+        all_envs = np.arange(self.num_envs)
+        observations = self.get_observations(all_envs)
+        rewards = self.calculate_navigation_rewards()
+        self.total_reward = rewards.copy()
+
+        reached = self.total_offset > 0
+        died = sim.y < self.level.goal_y
+        terminations = reached | died
+        truncations = ~terminations & (self.current_step > self.max_steps)
+        rewards[reached] += 5.0
+        rewards[truncations] -= 10.0
+        self.landed_n += int(np.count_nonzero(reached))
+
+        self.publish_spectators(pressed)
+
+        infos = {}
+        done = terminations | truncations
+        if done.any():
+            infos["final_obs"] = observations.copy()
+            infos["_final_obs"] = done
+            infos["truncated"] = truncations
+            infos["_truncated"] = truncations
+
+            self.count_attempts(np.nonzero(done)[0])
+            self.reset_envs(done)
+            observations[done] = self.get_observations(np.nonzero(done)[0])
+
+        return observations, rewards, terminations, truncations, infos
+
+    def check_offsets(self, prev_z_f32: np.ndarray):
+        # Engine.check_offset for the envs on their landing tick. Landings are rare, so each is
+        # worked out with Player's scalar arithmetic: float32 ** 2 rounds unlike array squaring.
+        sim = self.sim
+        goal_x, goal_y, goal_z = self.level.goal_x, self.level.goal_y, self.level.goal_z
+        landing = (sim.y > goal_y) & (sim.y + sim.vy < goal_y)
+
+        for i in np.nonzero(landing)[0]:
+            x = fl(sim.x[i]) if sim.x_f32[i] else float(sim.x[i])
+            z = fl(sim.z[i]) if sim.z_f32[i] else float(sim.z[i])
+            prev_z = fl(sim.prev_z[i]) if prev_z_f32[i] else float(sim.prev_z[i])
+
+            offset_x = 0
+            offset_z = 0
+            if self.level.landing_mode == LandingMode.NORMAL:
+                offset_x = x - goal_x
+                offset_z = z - goal_z
+            elif self.level.landing_mode == LandingMode.Z_NEO:
+                offset_x = x - goal_x
+                offset_z = prev_z - goal_z
+
+            if self.invert_x:
+                offset_x *= -1
+            if self.invert_z:
+                offset_z *= -1
+
+            total_offset = math.sqrt(offset_x ** 2 + offset_z ** 2)
+            if offset_x < 0 or offset_z < 0:
+                total_offset *= -1
+            self.total_offset[i] = total_offset
+
+    def calculate_navigation_rewards(self) -> np.ndarray:
+        rewards = -0.0005 * self.current_step
+        ended = (self.sim.y < self.level.goal_y) | (self.total_offset > 0)
+
+        for i in np.nonzero(ended)[0]:
+            offset = float(self.total_offset[i])
+            if offset > -998:
+                if offset < -3:
+                    rewards[i] = offset
+                elif offset < -1:
+                    rewards[i] = offset * 2 + 3
+                elif offset < 0:
+                    rewards[i] = (offset + 3) ** 2 - 3 + math.log(1/(-offset+10 ** (-10)))
+                else:
+                    rewards[i] = 16 + offset*100
+
+                if offset > self.best_offset:
+                    self.best_offset = offset
+
+                    if offset > 0.02:
+                        self.save_macro(i, MACRO_NAME + "_NEW_PB_" + str(offset), self.macro_n)
+            else:
+                rewards[i] -= 10
+
+        return rewards
+
+    def get_observations(self, envs: np.ndarray) -> np.ndarray:
+        # Same layout as ObservationBuilder
+        sim = self.sim
+        observations = np.zeros((len(envs), OBSERVATION_SIZE), dtype=np.float32)
+        x, y, z = sim.x[envs], sim.y[envs], sim.z[envs]
+        x_f32, z_f32 = sim.x_f32[envs], sim.z_f32[envs]
+
+        observations[:, 0] = mixed_op(np.subtract, self.level.goal_x, x, x_f32)
+        observations[:, 1] = self.level.goal_y - y
+        observations[:, 2] = mixed_op(np.subtract, self.level.goal_z, z, z_f32)
+
+        found = np.zeros(len(envs), dtype=bool)
+        if self.ground_field is not None:
+            rays, found = self.ground_field.lookup_batch(x, y - 1.25, z)
+            observations[found, GROUND_RAY_SLICE] = rays[found]
+        for i in range(len(envs)):
+            if found[i] and not self.blockage_rays:
+                continue
+
+            # Raycast with the scalar types Player would hold
+            player_x = fl(x[i]) if x_f32[i] else float(x[i])
+            player_z = fl(z[i]) if z_f32[i] else float(z[i])
+            if self.blockage_rays:
+                observations[i, BLOCKAGE_RAY_SLICE] = self.level.raycast_batch(player_x, float(y[i]), player_z, PLAYER_HEIGHT,
+                                                                               self.ray_dir_x, self.ray_dir_z, inverted=False)
+            if not found[i]:
+                observations[i, GROUND_RAY_SLICE] = self.level.raycast_batch(player_x, float(y[i]) - 1.25, player_z, 1.25,
+                                                                             self.ray_dir_x, self.ray_dir_z, inverted=True)
+
+        observations[:, GROUND_DISTANCE] = y - sim.jump_height[envs]
+        observations[:, FACING] = sim.facing[envs]
+        observations[:, VELOCITY] = np.stack([sim.vx[envs], sim.vy[envs], sim.vz[envs]], axis=1)
+        return observations
+
+    def record_macro_frames(self, pressed: np.ndarray):
+        # Player.record_macro_frame for every env; sneak is never pressed
+        pitch = self.sim.facing - self.prev_facing
+        pitch = np.where(pitch > 180, pitch - fl(360), np.where(pitch < -180, pitch + fl(360), pitch))
+        self.prev_facing = self.sim.facing.copy()
+        if not self.record_macros:
+            return
+
+        envs = np.arange(self.num_envs)
+        frame = np.minimum(self.macro_length, self.max_steps)
+        self.macro_frames["pitch"][envs, frame] = pitch
+        # W, A, S, D and sprint are bits 0-4 and space bit 6, see MACRO_KEYS
+        self.macro_frames["keys"][envs, frame] = pressed[:, :5] @ (1 << np.arange(5)) | pressed[:, 5] << 6
+        self.macro_length = frame + 1
+
+    def count_attempts(self, envs: np.ndarray):
+        # Environment.reset's periodic macro and landing rate, counted over episodes of all envs
+        for i in envs:
+            self.attempt_until_macro += 1
+            if self.attempt_until_macro >= MACRO_SAVING_INTERVALS:
+                self.save_macro(i, MACRO_NAME, self.macro_n)
+                self.macro_n += 1
+                self.attempt_until_macro = 0
+                print(f"Landing rate: {self.landed_n / MACRO_SAVING_INTERVALS:.2f}% ({self.landed_n}/{MACRO_SAVING_INTERVALS})")
+                self.landed_n = 0
+
+    def save_macro(self, env: int, name, iteration):
+        if not self.record_macros:
+            return
+
+        length = self.macro_length[env]
+        if length == 0:
+            print("Macro buffer is empty. Skipping save.")
+            return
+
+        spawn_coords = [float(Player.start_x), float(Player.start_y), float(Player.start_z), Player.start_f]
+        if self.start_states is not None:
+            spawn_coords = self.env_start_states[env]["position"].tolist() + [self.env_start_states[env]["facing"]]
+        macro_writer.enqueue(name, iteration, spawn_coords, self.macro_frames[env, :length])
+        self.macro_length[env] = 0
+
+    def publish_spectators(self, pressed: np.ndarray):
+        sim = self.sim
+        for i, spectator in enumerate(self.spectators):
+            keys = dict(zip(['W', 'A', 'S', 'D', 'sprint', 'space'], pressed[i].tolist()))
+            info_lines = [f"PB: {self.best_offset:.5f}", f"Reward: {self.total_reward[i]:.5f}"]
+            spectator.publish_state((sim.x[i], sim.y[i], sim.z[i]), (sim.vx[i], sim.vy[i], sim.vz[i]), sim.facing[i],
+                                    sim.jump_angle[i], sim.airborne[i], keys, info_lines)
+
+    def close_extras(self, **kwargs):
+        macro_writer.flush()
+        for spectator in self.spectators:
+            spectator.close()
+        self.spectators = []
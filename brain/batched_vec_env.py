@@ -0,0 +1,49 @@
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+class BatchedVecEnv(VecEnv):
+    # Stable Baselines3 VecEnv over a BatchedEnvironment: every env lives in this process, so
+    # stepping is one call instead of a round trip through a pipe per worker
+    def __init__(self, env):
+        self.env = env
+        self.actions = None
+        super().__init__(env.num_envs, env.single_observation_space, env.single_action_space)
+
+    def reset(self):
+        observations, _ = self.env.reset(seed=self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        return observations
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        observations, rewards, terminations, truncations, info = self.env.step(self.actions)
+        dones = terminations | truncations
+
+        # SB3 wants one info dict per env, with the last observation of an episode that ended
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.nonzero(dones)[0]:
+            infos[i]["terminal_observation"] = info["final_obs"][i]
+            infos[i]["TimeLimit.truncated"] = bool(truncations[i])
+            if truncations[i]:
+                infos[i]["truncated"] = True
+
+        return observations, rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        self.env.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.env, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self.env, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._get_indices(indices))
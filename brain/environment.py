@@ -2,18 +2,25 @@ import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 from engine.engine import Engine
+from engine.ground_field import GroundField
+from engine.observation import ObservationBuilder, OBSERVATION_SIZE
+from engine.pacing import PacingMode
+from engine.start_states import StartStatePool
 from engine.constants import *
 import math
-import pygame
 
 class Environment(gym.Env):
     metadata = {'render.modes': ['human']}
     
-    def __init__(self):
+    def __init__(self, spectator: str = None, headless: bool = HEADLESS, pacing: int = PacingMode.UNTHROTTLED,
+                 start_states: bool = START_STATE_POOL, record_macros: bool = RECORD_MACROS):
         super(Environment, self).__init__()
         
-        self.engine = Engine()
-        self.clock = pygame.time.Clock()
+        # spectator names the shared-memory ring a viewer can attach to, see engine.spectator.
+        # Training steps unthrottled; pass PacingMode.REALTIME to watch an agent at TICK_RATE.
+        self.engine = Engine(spectator, headless, pacing)
+        # Without record_macros no PB or periodic macros are saved, and ticks skip recording them
+        self.engine.player.recording_macro = record_macros
         
         """
         Unified Action Space
@@ -40,11 +47,26 @@ class Environment(gym.Env):
         self.observation_space = spaces.Box(
             low=-np.inf,
             high=np.inf, 
-            shape=(40,), 
+            shape=(OBSERVATION_SIZE,), 
             dtype=np.float32
         )
         
         self.current_step = 0
+        
+        ray_angles = [(i / RAYCAST_NUMBER) * 2 * math.pi for i in range(RAYCAST_NUMBER)]
+        self.ray_dir_x = np.array([math.cos(angle) for angle in ray_angles])
+        self.ray_dir_z = np.array([math.sin(angle) for angle in ray_angles])
+        
+        self.ground_field = None
+        if GROUND_FIELD:
+            self.ground_field = GroundField.load(self.engine.level, self.ray_dir_x, self.ray_dir_z, 1.25)
+        self.observation_builder = ObservationBuilder(self.ray_dir_x, self.ray_dir_z, self.ground_field)
+
+        # With start_states, episodes start from a pool of varied states inside the level's start
+        # bounds instead of always at Player.start_*
+        self.start_states = None
+        if start_states:
+            self.start_states = StartStatePool(self.engine.level)
 
         self.current_observation = None
         self.steps_in_placement = 0
@@ -76,14 +98,14 @@ class Environment(gym.Env):
             self.landed_n = 0
         
         # Reset game engine state
-        self.engine.reset()
+        self.engine.reset(self.start_states.sample() if self.start_states is not None else None)
         
         self.inputs_n = 0
         self.turns_n = 0
         self.moved_forward = False
         
         # Get initial observation for placement phase
-        observation = self._get_navigation_observation()
+        observation = self._get_navigation_observation(reset=True)
         info = {}
         
         self.current_step = 0
@@ -141,7 +163,7 @@ class Environment(gym.Env):
             truncated = True
             info['truncated'] = True
         
-        self.clock.tick(self.engine.tick_rate)
+        self.engine.pacer.wait()
         
         return observation, reward, terminated, truncated, info
     
@@ -159,42 +181,9 @@ class Environment(gym.Env):
         navigation_padding = np.zeros(self.navigation_obs_shape, dtype=np.float32)
         return np.concatenate([placement_obs, navigation_padding])
     
-    def _get_navigation_observation(self):
-        player_x, player_y, player_z = self.engine.get_player_position()
-        goal_x, goal_y, goal_z = self.engine.get_goal()
-        vx, vy, vz = self.engine.get_player_velocity()
-        facing = self.engine.get_player_facing()
-        
-        dist_to_goal = np.array([
-            goal_x - player_x,
-            goal_y - player_y,
-            goal_z - player_z
-        ], dtype=np.float32)
-        
-        velocity = np.array([vx, vy, vz])
-        
-        blockage_rays = []
-        ground_rays = []
-        
-        for i in range(RAYCAST_NUMBER):
-            angle = (i / RAYCAST_NUMBER) * 2 * math.pi
-        
-            #blockage_rays.append(self.engine.raycast(player_x, player_y, player_z, PLAYER_HEIGHT, angle))
-            blockage_rays.append(0)
-            ground_rays.append(self.engine.raycast(player_x, player_y-1.25, player_z, 1.25, angle, inverted=True))
-        
-        distance_to_ground = self.engine.get_distance_to_ground()
-        
-        navigation_obs = np.concatenate([
-            dist_to_goal,
-            np.array(blockage_rays),
-            np.array(ground_rays),
-            np.array([distance_to_ground]),
-            np.array([facing]),
-            velocity
-        ], dtype=np.float32)
-        
-        return navigation_obs
+    def _get_navigation_observation(self, reset=False):
+        # A view into the builder's buffer, valid until the next step (or reset, for reset=True)
+        return self.observation_builder.build(self.engine, reset)
     
     def calculate_navigation_reward(self):
         reward = -0.0005 * self.current_step
@@ -289,4 +278,9 @@ class Environment(gym.Env):
         return reward
     
     def save_macro(self, name, iteration):
-        return self.engine.save_macro(name, iteration)
\ No newline at end of file
+        if not self.engine.player.recording_macro:
+            return
+        return self.engine.save_macro(name, iteration)
+
+    def close(self):
+        self.engine.close()
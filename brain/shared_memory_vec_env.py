@@ -0,0 +1,238 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv, CloudpickleWrapper
+
+# Commands the workers read from the header once a round starts
+STEP = 1
+RESET = 2
+CALL = 3
+CLOSE = 4
+
+HEADER_DTYPE = np.dtype([("command", np.int64), ("failed", bool)])
+
+def make_slot_dtype(observation_space, action_space) -> np.dtype:
+    # One record per env: what the main process writes, then what its worker writes back
+    return np.dtype([
+        ("action", action_space.dtype, action_space.shape),
+        ("seed", np.int64),
+        ("observation", observation_space.dtype, observation_space.shape),
+        ("final_observation", observation_space.dtype, observation_space.shape),
+        ("reward", np.float64),
+        ("terminated", bool),
+        ("truncated", bool),
+    ])
+
+def map_buffers(memory: shared_memory.SharedMemory, slot_dtype: np.dtype, num_envs: int):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=memory.buf)
+    slots = np.ndarray((num_envs,), dtype=slot_dtype, buffer=memory.buf, offset=HEADER_DTYPE.itemsize)
+    return header, slots
+
+def worker(name: str, slot_dtype: np.dtype, num_envs: int, start: int, env_fns_wrapper, start_semaphore, done_semaphore, remote):
+    # Steps envs start..start+len(env_fns)-1. A round starts when the main process, having
+    # written the command and actions, releases this worker's start semaphore, and ends when the
+    # worker has written its results and released the shared done semaphore. A worker that fails
+    # flags it in the header and still ends its round, so the main process does not hang.
+    envs = []
+    memory = None
+    header = None
+    try:
+        # Workers share the main process's resource tracker, which unlinks the block once on close
+        memory = shared_memory.SharedMemory(name=name)
+        header, slots = map_buffers(memory, slot_dtype, num_envs)
+        envs = [env_fn() for env_fn in env_fns_wrapper.var]
+        slots = slots[start:start + len(envs)]
+
+        while True:
+            start_semaphore.acquire()
+            command = int(header["command"])
+            if command == CLOSE:
+                break
+
+            if command == STEP:
+                for i, env in enumerate(envs):
+                    observation, reward, terminated, truncated, _ = env.step(slots["action"][i])
+                    if terminated or truncated:
+                        slots["final_observation"][i] = observation
+                        observation, _ = env.reset()
+                    slots["observation"][i] = observation
+                    slots["reward"][i] = reward
+                    slots["terminated"][i] = terminated
+                    slots["truncated"][i] = truncated
+            elif command == RESET:
+                # Seeds are in the slots, options come through the pipe like a CALL. As in
+                # SubprocVecEnv, an env only gets options when it has some.
+                all_options = remote.recv()
+                for i, env in enumerate(envs):
+                    seed = int(slots["seed"][i])
+                    options = {"options": all_options[i]} if all_options[i] else {}
+                    slots["observation"][i], _ = env.reset(seed=seed if seed >= 0 else None, **options)
+            elif command == CALL:
+                # Rare requests that need a reply, like get_attr, go through the pipe
+                kind, attr_name, args, kwargs, indices = remote.recv()
+                results = []
+                for i in indices:
+                    env = envs[i - start]
+                    if kind == "get_attr":
+                        results.append(getattr(env, attr_name))
+                    elif kind == "set_attr":
+                        results.append(setattr(env, attr_name, args[0]))
+                    elif kind == "env_method":
+                        results.append(getattr(env, attr_name)(*args, **kwargs))
+                    elif kind == "env_is_wrapped":
+                        while isinstance(env, gym.Wrapper) and not isinstance(env, args[0]):
+                            env = env.env
+                        results.append(isinstance(env, args[0]))
+                remote.send(results)
+
+            done_semaphore.release()
+    except BaseException:
+        if header is not None:
+            header["failed"] = True
+        done_semaphore.release()
+        raise
+    finally:
+        for env in envs:
+            env.close()
+        header = None
+        slots = None
+        if memory is not None:
+            memory.close()
+
+class SharedMemoryVecEnv(VecEnv):
+    # Process-pool VecEnv like SubprocVecEnv, but actions, observations, rewards and dones are
+    # never pickled: they live in one shared-memory block that the main process and the workers
+    # map as NumPy arrays, and a round is synchronized with a pair of semaphores per worker.
+    # Each of num_workers processes steps a contiguous share of the envs.
+    def __init__(self, env_fns: list, num_workers: int = None, start_method: str = None):
+        num_envs = len(env_fns)
+        num_workers = min(num_workers or num_envs, num_envs)
+
+        # The spaces come from a throwaway env, the workers build their own
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.slot_dtype = make_slot_dtype(observation_space, action_space)
+        size = HEADER_DTYPE.itemsize + num_envs * self.slot_dtype.itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.header, self.slots = map_buffers(self.memory, self.slot_dtype, num_envs)
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        context = mp.get_context(start_method)
+
+        self.done_semaphore = context.Semaphore(0)
+        self.start_semaphores = []
+        self.remotes = []
+        self.processes = []
+        self.worker_envs = []
+        for share in np.array_split(np.arange(num_envs), num_workers):
+            start = int(share[0])
+            start_semaphore = context.Semaphore(0)
+            remote, work_remote = context.Pipe()
+            fns = CloudpickleWrapper(env_fns[start:start + len(share)])
+            process = context.Process(target=worker, args=(self.memory.name, self.slot_dtype, num_envs, start, fns,
+                                                           start_semaphore, self.done_semaphore, work_remote), daemon=True)
+            process.start()
+            work_remote.close()
+            self.start_semaphores.append(start_semaphore)
+            self.remotes.append(remote)
+            self.processes.append(process)
+            self.worker_envs.append(range(start, start + len(share)))
+
+        self.waiting = False
+        self.broken = False
+        self.closed = False
+
+    def run(self, command: int):
+        self.header["command"] = command
+        for semaphore in self.start_semaphores:
+            semaphore.release()
+
+    def wait(self):
+        for _ in self.processes:
+            while not self.done_semaphore.acquire(timeout=1.0):
+                if not all(process.is_alive() for process in self.processes):
+                    self.broken = True
+                    raise RuntimeError("A SharedMemoryVecEnv worker exited unexpectedly")
+
+        if self.header["failed"]:
+            self.broken = True
+            raise RuntimeError("A SharedMemoryVecEnv worker failed, see its traceback above")
+
+    def reset(self):
+        self.slots["seed"] = [seed if seed is not None else -1 for seed in self._seeds]
+        for remote, envs in zip(self.remotes, self.worker_envs):
+            remote.send([self._options[i] for i in envs])
+        self.run(RESET)
+        self.wait()
+        self._reset_seeds()
+        self._reset_options()
+        return self.slots["observation"].copy()
+
+    def step_async(self, actions):
+        self.slots["action"] = actions
+        self.run(STEP)
+        self.waiting = True
+
+    def step_wait(self):
+        self.wait()
+        self.waiting = False
+
+        # Info dicts are rebuilt here for the envs that finished, from the flags in the slots
+        terminated = self.slots["terminated"]
+        truncated = self.slots["truncated"]
+        dones = terminated | truncated
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.nonzero(dones)[0]:
+            infos[i]["terminal_observation"] = self.slots["final_observation"][i].copy()
+            infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+            if truncated[i]:
+                infos[i]["truncated"] = True
+
+        return self.slots["observation"].copy(), self.slots["reward"].copy(), dones, infos
+
+    def call(self, kind: str, attr_name: str, args: tuple = (), kwargs: dict = {}, indices=None):
+        indices = set(self._get_indices(indices))
+        for remote, envs in zip(self.remotes, self.worker_envs):
+            remote.send((kind, attr_name, args, kwargs, [i for i in envs if i in indices]))
+        self.run(CALL)
+        self.wait()
+
+        results = []
+        for remote in self.remotes:
+            results.extend(remote.recv())
+        return results
+
+    def get_attr(self, attr_name, indices=None):
+        return self.call("get_attr", attr_name, indices=indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self.call("set_attr", attr_name, (value,), indices=indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self.call("env_method", method_name, method_args, method_kwargs, indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self.call("env_is_wrapped", "", (wrapper_class,), indices=indices)
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self.waiting and not self.broken:
+            self.wait()
+        self.run(CLOSE)
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+
+        self.header = None
+        self.slots = None
+        self.memory.close()
+        self.memory.unlink()
+        self.closed = True
@@ -7,6 +7,10 @@ from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import SubprocVecEnv
 from stable_baselines3.common.callbacks import CheckpointCallback
 from environment import Environment
+from batched_environment import BatchedEnvironment
+from batched_vec_env import BatchedVecEnv
+from shared_memory_vec_env import SharedMemoryVecEnv
+from engine.spectator import get_spectator_name
 from stable_baselines3.common.callbacks import CheckpointCallback
 import threading
 
@@ -18,11 +22,16 @@ MODEL = "triple_gg"
 TIMESTEPS_PER_CHUNK = 1024*8
 NUM_ENVIRONMENTS = 4
 ENTROPY_COEF = 0.01
+SPECTATE = False # Watch any worker with python -m engine.spectator <worker>
+VEC_ENV = "batched" # "batched": every environment in this process with BatchedEnvironment,
+                    # "shared_memory": NUM_WORKERS processes with SharedMemoryVecEnv, "subproc": SubprocVecEnv
+NUM_SPECTATED = 4 # With "batched", the first environments publish as workers 0..NUM_SPECTATED-1
+NUM_WORKERS = 4 # With "shared_memory", the processes the environments are split between
 
 # Create a function to initialize environments
-def make_env():
+def make_env(rank):
     def _init():
-        env = Environment()
+        env = Environment(get_spectator_name(rank) if SPECTATE else None, headless=True)
         return env
     return _init
 
@@ -32,7 +41,12 @@ if __name__ == "__main__":
     os.makedirs(LOAD_PATH, exist_ok=True)
 
     # Create parallel environments
-    env = SubprocVecEnv([make_env() for _ in range(NUM_ENVIRONMENTS)])
+    if VEC_ENV == "batched":
+        env = BatchedVecEnv(BatchedEnvironment(NUM_ENVIRONMENTS, spectate=NUM_SPECTATED if SPECTATE else 0))
+    elif VEC_ENV == "shared_memory":
+        env = SharedMemoryVecEnv([make_env(rank) for rank in range(NUM_ENVIRONMENTS)], NUM_WORKERS)
+    else:
+        env = SubprocVecEnv([make_env(rank) for rank in range(NUM_ENVIRONMENTS)])
 
     checkpoint_callback = CheckpointCallback(
         save_freq=TIMESTEPS_PER_CHUNK*15,
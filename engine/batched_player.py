@@ -0,0 +1,302 @@
+import numpy as np
+from .constants import *
+from .level import Level
+from .mcmath import sin_array, cos_array
+from .player import Player, AIR_MOVEMENT, AIR_SPRINT_MOVEMENT, GROUND_MOVEMENT, GROUND_SPRINT_MOVEMENT
+
+HALF_SIZE = PLAYER_SIZE / 2
+
+
+def mixed_op(op, a, b, as_f32):
+    # Player keeps positions and velocities as Python floats until a float32
+    # leaks into them, after which numpy promotion keeps them float32. Values are
+    # stored as float64 here and the as_f32 mask selects the float32 arithmetic.
+    exact = op(a, b)
+    if not as_f32.any():
+        return exact
+
+    rounded = op(np.asarray(a, dtype=fl), np.asarray(b, dtype=fl)).astype(np.float64)
+    return np.where(as_f32, rounded, exact)
+
+
+class BatchedPlayerSim:
+    def __init__(self, level: Level, num_players: int,
+                 x: float = Player.start_x, y: float = Player.start_y, z: float = Player.start_z, f: float = Player.start_f):
+        if ANGLES != 65536:
+            raise ValueError("BatchedPlayerSim only supports ANGLES == 65536")
+
+        self.level = level
+        self.num_players = num_players
+        self.inertia_threshold = 0.005
+        self.air_sprint_delay = True
+
+        n = num_players
+        self.x = np.zeros(n, dtype=np.float64)
+        self.y = np.zeros(n, dtype=np.float64)
+        self.z = np.zeros(n, dtype=np.float64)
+        self.vx = np.zeros(n, dtype=np.float64)
+        self.vy = np.zeros(n, dtype=np.float64)
+        self.vz = np.zeros(n, dtype=np.float64)
+        self.x_f32 = np.zeros(n, dtype=bool)
+        self.z_f32 = np.zeros(n, dtype=bool)
+        self.vx_f32 = np.zeros(n, dtype=bool)
+        self.vz_f32 = np.zeros(n, dtype=bool)
+        self.prev_x = np.zeros(n, dtype=np.float64)
+        self.prev_y = np.zeros(n, dtype=np.float64)
+        self.prev_z = np.zeros(n, dtype=np.float64)
+
+        self.facing = np.zeros(n, dtype=fl)
+        self.forward = np.zeros(n, dtype=fl)
+        self.strafe = np.zeros(n, dtype=fl)
+        self.airborne = np.zeros(n, dtype=bool)
+        self.sprinting = np.zeros(n, dtype=bool)
+        self.sneaking = np.zeros(n, dtype=bool)
+        self.jumping = np.zeros(n, dtype=bool)
+        self.prev_sprint = np.zeros(n, dtype=bool)
+        self.is_colliding = np.zeros(n, dtype=bool)
+
+        # NaN marks a player that has not ticked yet (Player.prev_slip is None)
+        self.prev_slip = np.full(n, np.nan, dtype=fl)
+        self.ground_slip = np.full(n, fl(0.6), dtype=fl)
+        self.jump_angle = np.zeros(n, dtype=fl)
+        self.jump_height = np.full(n, float(y), dtype=np.float64)
+
+        self.load_level(level)
+        self.set_position(x, y, z, f)
+
+    def load_level(self, level: Level):
+        self.level = level
+        boxes, cells = level.get_collision_boxes()
+        self.boxes = boxes
+        self.box_cells = cells
+        self.boxes_f32 = boxes.astype(fl).astype(np.float64)
+        self.boxes_exact_f32 = bool(np.all(self.boxes_f32 == boxes))
+        self.merged_boxes, self.merged_members = level.get_merged_boxes()
+        self.merged_boxes_f32 = self.merged_boxes.astype(fl).astype(np.float64)
+
+    def set_position(self, x=Player.start_x, y=Player.start_y, z=Player.start_z, f=Player.start_f, mask=None):
+        if mask is None:
+            mask = np.ones(self.num_players, dtype=bool)
+
+        self.x[mask] = x
+        self.y[mask] = y
+        self.z[mask] = z
+        self.facing[mask] = f
+        self.vx[mask] = 0.0
+        self.vy[mask] = -0.001
+        self.vz[mask] = 0.0
+        self.x_f32[mask] = False
+        self.z_f32[mask] = False
+        self.vx_f32[mask] = False
+        self.vz_f32[mask] = False
+        self.airborne[mask] = False
+        self.jumping[mask] = False
+
+    def set_movement(self, w, a, s, d, sprint, space):
+        w = np.asarray(w, dtype=bool)
+        a = np.asarray(a, dtype=bool)
+        s = np.asarray(s, dtype=bool)
+        d = np.asarray(d, dtype=bool)
+
+        forward = np.zeros(self.num_players, dtype=fl)
+        forward[w & ~s] = 1.0
+        forward[s & ~w] = -1.0
+        strafe = np.zeros(self.num_players, dtype=fl)
+        strafe[a & ~d] = 1.0
+        strafe[d & ~a] = -1.0
+
+        self.forward = forward
+        self.strafe = strafe
+        self.sprinting = np.broadcast_to(np.asarray(sprint, dtype=bool), (self.num_players,)).copy()
+        self.jumping = np.broadcast_to(np.asarray(space, dtype=bool), (self.num_players,)).copy()
+
+    def turn(self, mouse_delta):
+        self.facing = self.facing + np.asarray(mouse_delta, dtype=fl)
+
+    def tick(self):
+        airborne = self.airborne.copy()
+        self.is_colliding = np.zeros(self.num_players, dtype=bool)
+
+        self.prev_x = self.x.copy()
+        self.prev_y = self.y.copy()
+        self.prev_z = self.z.copy()
+
+        # Y collision detection
+        min_x = mixed_op(np.subtract, self.x, HALF_SIZE, self.x_f32)
+        max_x = mixed_op(np.add, self.x, HALF_SIZE, self.x_f32)
+        min_z = mixed_op(np.subtract, self.z, HALF_SIZE, self.z_f32)
+        max_z = mixed_op(np.add, self.z, HALF_SIZE, self.z_f32)
+        min_y = self.y + self.vy
+        max_y = (self.y + PLAYER_HEIGHT) + self.vy
+
+        hit, bbox = self.check_collision(min_x, max_x, min_y, max_y, min_z, max_z, self.x_f32, self.z_f32)
+        up = hit & (self.vy > 0)
+        down = hit & (self.vy < 0)
+        self.y = np.where(up, bbox[:, 2] - HALF_SIZE, np.where(down, bbox[:, 3], np.where(hit, self.y, self.y + self.vy)))
+        airborne = np.where(down, False, np.where(hit, airborne, True))
+        self.vy = np.where(hit, 0.0, self.vy)
+
+        # X collision detection
+        moved_f32 = self.x_f32 | self.vx_f32
+        min_x = mixed_op(np.add, mixed_op(np.subtract, self.x, HALF_SIZE, self.x_f32), self.vx, moved_f32)
+        max_x = mixed_op(np.add, mixed_op(np.add, self.x, HALF_SIZE, self.x_f32), self.vx, moved_f32)
+        min_y = self.y
+        max_y = self.y + PLAYER_HEIGHT
+
+        hit, bbox = self.check_collision(min_x, max_x, min_y, max_y, min_z, max_z, moved_f32, self.z_f32)
+        positive = hit & (self.vx > 0)
+        negative = hit & (self.vx < 0)
+        moved = mixed_op(np.add, self.x, self.vx, moved_f32)
+        self.x = np.where(positive, (bbox[:, 0] - HALF_SIZE) - COLLISION_HITBOX_GROWTH,
+                          np.where(negative, (bbox[:, 1] + HALF_SIZE) + COLLISION_HITBOX_GROWTH,
+                                   np.where(hit, self.x, moved)))
+        self.x_f32 = np.where(hit, self.x_f32 & ~(positive | negative), moved_f32)
+        self.vx = np.where(hit, 0.0, self.vx)
+        self.vx_f32 &= ~hit
+        self.is_colliding |= hit
+
+        # Z collision detection
+        min_x = mixed_op(np.subtract, self.x, HALF_SIZE, self.x_f32)
+        max_x = mixed_op(np.add, self.x, HALF_SIZE, self.x_f32)
+        moved_f32 = self.z_f32 | self.vz_f32
+        min_z = mixed_op(np.add, mixed_op(np.subtract, self.z, HALF_SIZE, self.z_f32), self.vz, moved_f32)
+        max_z = mixed_op(np.add, mixed_op(np.add, self.z, HALF_SIZE, self.z_f32), self.vz, moved_f32)
+
+        hit, bbox = self.check_collision(min_x, max_x, min_y, max_y, min_z, max_z, self.x_f32, moved_f32)
+        positive = hit & (self.vz > 0)
+        negative = hit & (self.vz < 0)
+        moved = mixed_op(np.add, self.z, self.vz, moved_f32)
+        self.z = np.where(positive, (bbox[:, 4] - HALF_SIZE) - COLLISION_HITBOX_GROWTH,
+                          np.where(negative, (bbox[:, 5] + HALF_SIZE) + COLLISION_HITBOX_GROWTH,
+                                   np.where(hit, self.z, moved)))
+        self.z_f32 = np.where(hit, self.z_f32 & ~(positive | negative), moved_f32)
+        self.vz = np.where(hit, 0.0, self.vz)
+        self.vz_f32 &= ~hit
+        self.is_colliding |= hit
+
+        slip = np.where(airborne, fl(1.0), self.ground_slip)
+        self.sprinting &= ~self.is_colliding
+        self.prev_slip = np.where(np.isnan(self.prev_slip), slip, self.prev_slip)
+
+        # Finalizing momentum
+        friction = (fl(0.91) * self.prev_slip).astype(np.float64)
+        self.vx = mixed_op(np.multiply, self.vx, friction, self.vx_f32)
+        self.vz = mixed_op(np.multiply, self.vz, friction, self.vz_f32)
+
+        jumping = self.jumping & ~airborne
+        self.jump_angle = np.where(jumping, self.facing, self.jump_angle)
+        self.jump_height = np.where(jumping, self.y, self.jump_height)
+        self.vy = np.where(jumping, 0.42, (self.vy - 0.08) * 0.98)
+
+        # Applying inertia threshold
+        threshold = self.inertia_threshold
+        threshold_f32 = float(fl(threshold))
+        stopped = np.abs(self.vx) < np.where(self.vx_f32, threshold_f32, threshold)
+        self.vx[stopped] = 0.0
+        self.vx_f32 &= ~stopped
+        stopped = np.abs(self.vz) < np.where(self.vz_f32, threshold_f32, threshold)
+        self.vz[stopped] = 0.0
+        self.vz_f32 &= ~stopped
+        self.vy[np.abs(self.vy) < threshold] = 0.0
+
+        # Applying sprintjump boost
+        boost = self.sprinting & jumping
+        if boost.any():
+            facing = self.facing * fl(0.017453292)
+            sin_boost = sin_array(facing) * fl(SPRINTJUMP_BOOST)
+            cos_boost = cos_array(facing) * fl(SPRINTJUMP_BOOST)
+            self.vx = np.where(boost, (self.vx.astype(fl) - sin_boost).astype(np.float64), self.vx)
+            self.vz = np.where(boost, (self.vz.astype(fl) + cos_boost).astype(np.float64), self.vz)
+            self.vx_f32 |= boost
+            self.vz_f32 |= boost
+
+        # Calculating movement multiplier
+        if self.air_sprint_delay:
+            air_sprint = self.prev_sprint
+        else:
+            air_sprint = self.sprinting
+        drag = fl(0.91) * slip
+        ground = np.where(self.sprinting, GROUND_SPRINT_MOVEMENT, GROUND_MOVEMENT).astype(fl) * (fl(0.16277136) / (drag * drag * drag))
+        movement = np.where(airborne, np.where(air_sprint, AIR_SPRINT_MOVEMENT, AIR_MOVEMENT), ground).astype(fl)
+
+        # Applying sneaking
+        forward = np.where(self.sneaking, (self.forward.astype(np.float64) * 0.3).astype(fl), self.forward)
+        strafe = np.where(self.sneaking, (self.strafe.astype(np.float64) * 0.3).astype(fl), self.strafe)
+
+        forward = forward * fl(0.98)
+        strafe = strafe * fl(0.98)
+
+        distance = strafe * strafe + forward * forward
+        accelerating = distance >= fl(0.0001)
+
+        if accelerating.any():
+            distance = np.sqrt(distance.astype(np.float64)).astype(fl)
+            distance = np.where(distance < fl(1.0), fl(1.0), distance).astype(fl)
+
+            distance = movement / distance
+            forward = forward * distance
+            strafe = strafe * distance
+
+            yaw = self.facing * fl(PI) / fl(180.0)
+            sin_yaw = sin_array(yaw)
+            cos_yaw = cos_array(yaw)
+            delta_x = (strafe * cos_yaw - forward * sin_yaw).astype(np.float64)
+            delta_z = (forward * cos_yaw + strafe * sin_yaw).astype(np.float64)
+            self.vx = np.where(accelerating, mixed_op(np.add, self.vx, delta_x, self.vx_f32), self.vx)
+            self.vz = np.where(accelerating, mixed_op(np.add, self.vz, delta_z, self.vz_f32), self.vz)
+
+        self.prev_sprint = self.sprinting.copy()
+        self.prev_slip = slip
+        self.jumping = np.zeros(self.num_players, dtype=bool)
+        self.airborne = airborne | jumping
+
+    def check_collision(self, min_x, max_x, min_y, max_y, min_z, max_z, x_f32, z_f32):
+        num_boxes = len(self.boxes)
+        if num_boxes == 0:
+            return np.zeros(self.num_players, dtype=bool), np.zeros((self.num_players, 6))
+
+        # Merged boxes are the union of their members, so only members of touched ones can hit
+        touched = self.intersect(min_x[:, None], max_x[:, None], min_y[:, None], max_y[:, None], min_z[:, None], max_z[:, None],
+                                 self.merged_boxes[None], self.merged_boxes_f32[None], x_f32[:, None], z_f32[:, None])
+        player_index, merged_index = np.nonzero(touched)
+        candidates = self.merged_members[merged_index]
+        player_index = np.repeat(player_index, candidates.shape[1])
+        candidates = candidates.ravel()
+        player_index = player_index[candidates >= 0]
+        candidates = candidates[candidates >= 0]
+
+        # Same candidate area Level.check_collision gathers blocks from
+        cells = self.box_cells[candidates]
+        in_area = ((np.trunc(min_x[player_index]) - 1 <= cells[:, 0]) & (cells[:, 0] <= np.trunc(max_x[player_index]) + 1) &
+                   (np.trunc(min_y[player_index]) <= cells[:, 1]) & (cells[:, 1] <= np.trunc(max_y[player_index])) &
+                   (np.trunc(min_z[player_index]) - 1 <= cells[:, 2]) & (cells[:, 2] <= np.trunc(max_z[player_index]) + 1))
+
+        intersects = in_area & self.intersect(min_x[player_index], max_x[player_index], min_y[player_index], max_y[player_index],
+                                              min_z[player_index], max_z[player_index], self.boxes[candidates], self.boxes_f32[candidates],
+                                              x_f32[player_index], z_f32[player_index])
+
+        # Boxes are in block order, so the lowest intersecting row is the first hit
+        first = np.full(self.num_players, num_boxes)
+        np.minimum.at(first, player_index[intersects], candidates[intersects])
+        hit = first < num_boxes
+
+        return hit, self.boxes[np.where(hit, first, 0)]
+
+    def intersect(self, min_x, max_x, min_y, max_y, min_z, max_z, boxes, boxes_f32, x_f32, z_f32):
+        # A float32 player coordinate compares against the float32 rounding of the box
+        if self.boxes_exact_f32:
+            boxes_x = boxes_z = boxes
+        else:
+            boxes_x = np.where(x_f32[..., None], boxes_f32, boxes)
+            boxes_z = np.where(z_f32[..., None], boxes_f32, boxes)
+
+        return ((min_x < boxes_x[..., 1]) & (max_x > boxes_x[..., 0]) &
+                (min_y < boxes[..., 3]) & (max_y > boxes[..., 2]) &
+                (min_z < boxes_z[..., 5]) & (max_z > boxes_z[..., 4]))
+
+    def get_positions(self):
+        return self.x, self.y, self.z
+
+    def get_velocities(self):
+        return self.vx, self.vy, self.vz
+
@@ -0,0 +1,299 @@
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from .constants import *
+from .level import Level
+from .broadphase import Broadphase
+from .level_file import BLOCK_TYPES, CONNECTIONS
+
+def make_pane_level(size: int = 40, density: float = 0.6, seed: int = 0) -> Level:
+    # A stone floor with glass panes of random connections on top, like a fence maze
+    rng = np.random.default_rng(seed)
+    cells = []
+    types = []
+    connections = []
+
+    for x in range(-size // 2, size // 2):
+        for z in range(-size // 2, size // 2):
+            cells.append((x, 9, z))
+            types.append(BLOCK_TYPES.index("stone"))
+            connections.append([False] * len(CONNECTIONS))
+
+            if rng.random() < density:
+                cells.append((x, 10, z))
+                types.append(BLOCK_TYPES.index("glass_pane"))
+                connections.append((rng.random(len(CONNECTIONS)) < 0.5).tolist())
+
+    level = Level()
+    level.load_compiled({
+        "block_types": np.array(types, dtype=np.int8),
+        "block_cells": np.array(cells, dtype=np.int64),
+        "block_blockage": np.ones(len(cells), dtype=bool),
+        "block_connections": np.array(connections, dtype=bool),
+        "start_bounds": np.array([0, 1, 10, 10, 0, 1], dtype=np.float64),
+        "goal": np.array([0, 10, size // 2], dtype=np.float64),
+        "landing_mode": np.array("NORMAL"),
+    })
+    return level
+
+def scan_collision(blocks, min_x, max_x, min_y, max_y, min_z, max_z, start_x, end_x, start_y, end_y, start_z, end_z):
+    # The flat scan Level.check_collision used before blocks were indexed
+    for block in blocks:
+        if block.blockage is False:
+            continue
+        if not (start_x <= block.x <= end_x and start_z <= block.z <= end_z and start_y <= block.y <= end_y):
+            continue
+
+        for bbox in block.get_bounding_box():
+            if (min_x < bbox.max_x and max_x > bbox.min_x and
+                min_y < bbox.max_y and max_y > bbox.min_y and
+                min_z < bbox.max_z and max_z > bbox.min_z):
+                return bbox
+
+    return None
+
+def time_queries(function, queries):
+    # One untimed pass first, so chunk loading and tree building are not counted
+    for query in queries:
+        function(*query)
+
+    start = time.perf_counter()
+    results = [function(*query) for query in queries]
+    return (time.perf_counter() - start) / len(queries) * 1e6, results
+
+def benchmark_box_tree(level: Level, samples: int = 2000, seed: int = 0):
+    # Flat scans over Level.blocks against the chunk box trees for the three queries they serve.
+    # Returns {query: (flat us, tree us, mismatches)}
+    rng = np.random.default_rng(seed)
+    cells = level.blocks.get_cells()
+    low = cells.min(axis=0)
+    high = cells.max(axis=0) + 1
+    level.blocks.prefetch(0, 0, int(max(np.abs(low).max(), np.abs(high).max())) // CHUNK_SIZE + 1)
+    blocks = list(level.blocks)
+    results = {}
+
+    collisions = []
+    for _ in range(samples):
+        x = rng.uniform(low[0], high[0])
+        y = rng.uniform(low[1], high[1])
+        z = rng.uniform(low[2], high[2])
+        min_x, max_x, min_y, max_y, min_z, max_z = x - 0.3, x + 0.3, y, y + PLAYER_HEIGHT, z - 0.3, z + 0.3
+        collisions.append((min_x, max_x, min_y, max_y, min_z, max_z,
+                           int(min_x) - 1, int(max_x) + 1, int(min_y), int(max_y), int(min_z) - 1, int(max_z) + 1))
+
+    flat_time, expected = time_queries(lambda *query: scan_collision(blocks, *query), collisions)
+    tree_time, found = time_queries(lambda *query: level.check_collision_at(*query[:6]), collisions)
+    results["check_collision"] = (flat_time, tree_time, sum(a is not b for a, b in zip(expected, found)))
+
+    rays = []
+    for _ in range(samples):
+        angle = rng.uniform(0, 2 * math.pi)
+        rays.append((rng.uniform(low[0], high[0]), rng.uniform(low[1], high[1]), rng.uniform(low[2], high[2]),
+                     1.25, math.cos(angle), 0, math.sin(angle)))
+
+    # The flat ray scans the blocks get_blocks_along_ray gathers, as Level.raycast used to
+    def scan_ray(x, y, z, height, dir_x, dir_y, dir_z):
+        blocks = level.get_blocks_along_ray(x, y, z, x + dir_x * MAX_RAYCAST_DISTANCE, y + height, z + dir_z * MAX_RAYCAST_DISTANCE)
+        return level.normal_raycast(x, y, z, height, dir_x, dir_y, dir_z, blocks)
+
+    flat_time, expected = time_queries(scan_ray, rays)
+    tree_time, found = time_queries(level.normal_raycast, rays)
+    results["normal_raycast"] = (flat_time, tree_time, sum(a != b for a, b in zip(expected, found)))
+
+    directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    points = []
+    for _ in range(samples):
+        points.append((rng.uniform(low[0], high[0]), rng.uniform(low[2], high[2]), rng.uniform(low[1], high[1]),
+                       directions[rng.integers(len(directions))]))
+
+    flat_time, expected = time_queries(lambda *point: level.find_adjacent_block(*point, blocks), points)
+    tree_time, found = time_queries(level.find_adjacent_block, points)
+    results["find_adjacent_block"] = (flat_time, tree_time, sum(a is not b for a, b in zip(expected, found)))
+
+    return results
+
+def benchmark_broadphase(level: Level, steps: int = 2000, seed: int = 0):
+    # The three axis queries of a player wandering the level, straight against the level and
+    # through a Broadphase. Returns (level us, broadphase us, mismatches) per tick.
+    rng = np.random.default_rng(seed)
+    cells = level.blocks.get_cells()
+    low = cells.min(axis=0)
+    high = cells.max(axis=0) + 1
+    half_size = PLAYER_SIZE / 2
+
+    x, y, z = (low + high) / 2
+    ticks = []
+    for _ in range(steps):
+        vx, vy, vz = rng.normal(0, 0.15), rng.normal(0, 0.2), rng.normal(0, 0.15)
+        x = min(max(x + vx, low[0]), high[0])
+        y = min(max(y + vy, low[1]), high[1])
+        z = min(max(z + vz, low[2]), high[2])
+        ticks.append((x, y, z, vx, vy, vz))
+
+    def tick_level(x, y, z, vx, vy, vz):
+        return (level.check_collision_at(x - half_size, x + half_size, y + vy, y + PLAYER_HEIGHT + vy, z - half_size, z + half_size),
+                level.check_collision_at(x - half_size + vx, x + half_size + vx, y, y + PLAYER_HEIGHT, z - half_size, z + half_size),
+                level.check_collision_at(x - half_size, x + half_size, y, y + PLAYER_HEIGHT, z - half_size + vz, z + half_size + vz))
+
+    broadphase = Broadphase()
+    def tick_broadphase(x, y, z, vx, vy, vz):
+        broadphase.prepare(level, x - half_size + min(vx, 0), x + half_size + max(vx, 0),
+                           y + min(vy, 0), y + PLAYER_HEIGHT + max(vy, 0), z - half_size + min(vz, 0), z + half_size + max(vz, 0))
+        return (broadphase.check_collision_at(level, x - half_size, x + half_size, y + vy, y + PLAYER_HEIGHT + vy, z - half_size, z + half_size),
+                broadphase.check_collision_at(level, x - half_size + vx, x + half_size + vx, y, y + PLAYER_HEIGHT, z - half_size, z + half_size),
+                broadphase.check_collision_at(level, x - half_size, x + half_size, y, y + PLAYER_HEIGHT, z - half_size + vz, z + half_size + vz))
+
+    level_time, expected = time_queries(tick_level, ticks)
+    broadphase_time, found = time_queries(tick_broadphase, ticks)
+    mismatches = sum(any(a is not b for a, b in zip(hits, other)) for hits, other in zip(expected, found))
+    return level_time, broadphase_time, mismatches
+
+# Imported one per fresh interpreter, so each time includes everything the module pulls in
+STARTUP_MODULES = ["numpy", "gymnasium", "pygame", "engine.mcmath", "engine.level", "engine.player", "engine.engine",
+                   "brain.environment"]
+
+STARTUP_IMPORT_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+STARTUP_STEP_SCRIPT = """
+import json, sys, time
+import numpy as np
+times = {}
+start = time.perf_counter()
+from brain.environment import Environment
+times["import"] = time.perf_counter() - start
+start = time.perf_counter()
+env = Environment(headless=True)
+times["create"] = time.perf_counter() - start
+start = time.perf_counter()
+env.reset()
+times["reset"] = time.perf_counter() - start
+action = np.zeros(env.action_space.shape, dtype=np.float32)
+start = time.perf_counter()
+env.step(action)
+times["first step"] = time.perf_counter() - start
+start = time.perf_counter()
+env.step(action)
+times["second step"] = time.perf_counter() - start
+env.close()
+times["pygame imported"] = "pygame" in sys.modules
+print(json.dumps(times))
+"""
+
+def run_startup_script(script: str, *args) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", script, *args], cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def benchmark_startup(modules: list = STARTUP_MODULES, runs: int = 5):
+    # What a freshly spawned training worker pays before its first step. Returns
+    # ({module: import ms}, {phase: ms}) as the best of runs fresh interpreters, after a run that
+    # warms the OS file cache and builds the compiled level cache.
+    run_startup_script(STARTUP_STEP_SCRIPT)
+
+    imports = {}
+    for module in modules:
+        imports[module] = min(run_startup_script(STARTUP_IMPORT_SCRIPT, module)["import"] for _ in range(runs)) * 1e3
+
+    results = [run_startup_script(STARTUP_STEP_SCRIPT) for _ in range(runs)]
+    phases = {phase: min(result[phase] for result in results) * 1e3 for phase in results[0] if phase != "pygame imported"}
+    phases["pygame imported"] = any(result["pygame imported"] for result in results)
+
+    return imports, phases
+
+def benchmark_vector_env(num_envs: int = 256, steps: int = 500, seed: int = 0):
+    # Environment steps per second: one Environment stepped in a loop against
+    # BatchedEnvironment stepping num_envs players per call, both headless. Both read ground rays
+    # from the ground field only with GROUND_FIELD set, and raycast them otherwise.
+    from brain.environment import Environment
+    from brain.batched_environment import BatchedEnvironment
+
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(0, 1, (steps, num_envs, 7)).astype(np.float32)
+    actions[:, :, 6] = rng.normal(0, 8, (steps, num_envs))
+
+    env = Environment(headless=True)
+    env.reset()
+    start = time.perf_counter()
+    for action in actions[:, 0]:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    environment_rate = steps / (time.perf_counter() - start)
+    env.close()
+
+    vector_env = BatchedEnvironment(num_envs, level=env.engine.level, ground_field=GROUND_FIELD)
+    vector_env.reset(seed=seed)
+    start = time.perf_counter()
+    for action in actions:
+        vector_env.step(action)
+    batched_rate = steps * num_envs / (time.perf_counter() - start)
+    vector_env.close()
+
+    return environment_rate, batched_rate
+
+def make_headless_environment():
+    from brain.environment import Environment
+    return Environment(headless=True)
+
+def benchmark_transport(num_envs: int = 16, steps: int = 500, seed: int = 0):
+    # Steps per second of num_envs headless Environments, one per worker process, behind
+    # SubprocVecEnv (pickled pipes) and SharedMemoryVecEnv (shared buffers and semaphores)
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from brain.shared_memory_vec_env import SharedMemoryVecEnv
+
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(0, 1, (steps, num_envs, 7)).astype(np.float32)
+    actions[:, :, 6] = rng.normal(0, 8, (steps, num_envs))
+
+    rates = {}
+    for vec_env_class in (SubprocVecEnv, SharedMemoryVecEnv):
+        vec_env = vec_env_class([make_headless_environment] * num_envs)
+        vec_env.reset()
+        start = time.perf_counter()
+        for action in actions:
+            vec_env.step(action)
+        rates[vec_env_class.__name__] = steps * num_envs / (time.perf_counter() - start)
+        vec_env.close()
+
+    return rates
+
+if __name__ == "__main__" and sys.argv[1:2] == ["transport"]:
+    num_envs = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    for name, rate in benchmark_transport(num_envs).items():
+        print(f"{name} x{num_envs}: {rate:.0f} steps/s")
+
+elif __name__ == "__main__" and sys.argv[1:2] == ["vector"]:
+    num_envs = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    environment_rate, batched_rate = benchmark_vector_env(num_envs)
+    print(f"Environment: {environment_rate:.0f} steps/s, BatchedEnvironment x{num_envs}: {batched_rate:.0f} steps/s "
+          f"({batched_rate / environment_rate:.1f}x)")
+
+elif __name__ == "__main__" and sys.argv[1:] == ["startup"]:
+    imports, phases = benchmark_startup()
+    for module, import_time in imports.items():
+        print(f"import {module}: {import_time:.1f} ms")
+    for phase, value in phases.items():
+        print(f"headless environment {phase}: {value if isinstance(value, bool) else f'{value:.1f} ms'}")
+
+elif __name__ == "__main__":
+    import pygame
+    pygame.init()
+
+    level = make_pane_level()
+    print(f"Pane level: {len(level.blocks)} blocks, {len(level.get_collision_boxes()[0])} boxes")
+    for query, (flat_time, tree_time, mismatches) in benchmark_box_tree(level).items():
+        print(f"{query}: flat scan {flat_time:.1f} us, box tree {tree_time:.1f} us "
+              f"({flat_time / tree_time:.1f}x), {mismatches} mismatches")
+
+    level_time, broadphase_time, mismatches = benchmark_broadphase(level)
+    print(f"player tick collisions: level {level_time:.1f} us, broadphase {broadphase_time:.1f} us "
+          f"({level_time / broadphase_time:.1f}x), {mismatches} mismatches")
@@ -1,5 +1,6 @@
+from __future__ import annotations
 from ..bounding_box import BoundingBox
-import pygame
+from ..lazy import pygame
 from ..camera import Camera
 from ..constants import *
 
@@ -28,7 +29,7 @@ class Block:
             
             on_screen = False
             for screen_x, screen_y in corners_screen:
-                if (0 <= screen_x < SCREEN_WIDTH and 0 <= screen_y < SCREEN_HEIGHT):
+                if (0 <= screen_x < surface.get_width() and 0 <= screen_y < surface.get_height()):
                     on_screen = True
                     break
             
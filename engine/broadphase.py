@@ -0,0 +1,83 @@
+from .constants import *
+
+class Broadphase:
+    # Solid sub-boxes of the blocks in a cell region around one player, gathered once and reused
+    # by every collision query whose candidate area lies inside the region. The boxes are kept in
+    # block order and then in get_bounding_box order, so the first one a query hits is the one
+    # Level.check_collision_at returns. The region is gathered again once a query leaves it or
+    # blocks are added to the level.
+    def __init__(self, margin: int = BROADPHASE_MARGIN):
+        self.margin = margin
+        self.blocks = None
+        self.num_blocks = 0
+        self.region = None
+        self.bounds = []
+        self.cells = []
+        self.bboxes = []
+
+    def gather(self, level, min_x: float, max_x: float, min_y: float, max_y: float, min_z: float, max_z: float):
+        # Gathers the candidate area check_collision_at would use for the box, grown by the margin
+        start_x = int(min_x) - 1 - self.margin
+        end_x = int(max_x) + 1 + self.margin
+        start_y = int(min_y) - self.margin
+        end_y = int(max_y) + self.margin
+        start_z = int(min_z) - 1 - self.margin
+        end_z = int(max_z) + 1 + self.margin
+
+        self.blocks = level.blocks
+        self.num_blocks = len(level.blocks)
+        self.region = (start_x, end_x, start_y, end_y, start_z, end_z)
+        self.bounds = []
+        self.cells = []
+        self.bboxes = []
+
+        for block in level.get_blocks_in_area(start_x, end_x, start_y, end_y, start_z, end_z):
+            if block.blockage is False:
+                continue
+
+            for bbox in block.get_bounding_box():
+                self.bounds.append((bbox.min_x, bbox.max_x, bbox.min_y, bbox.max_y, bbox.min_z, bbox.max_z))
+                self.cells.append((block.x, block.y, block.z))
+                self.bboxes.append(bbox)
+
+    def prepare(self, level, min_x: float, max_x: float, min_y: float, max_y: float, min_z: float, max_z: float):
+        # Called once per tick with the whole volume the tick may sweep. Keeps the gathered boxes
+        # while that volume stays inside the region and the level's blocks are unchanged.
+        if self.blocks is not level.blocks or self.num_blocks != len(level.blocks):
+            self.region = None
+
+        if not self.covers(int(min_x) - 1, int(max_x) + 1, int(min_y), int(max_y), int(min_z) - 1, int(max_z) + 1):
+            self.gather(level, min_x, max_x, min_y, max_y, min_z, max_z)
+
+    def covers(self, start_x: int, end_x: int, start_y: int, end_y: int, start_z: int, end_z: int) -> bool:
+        if self.region is None:
+            return False
+
+        region_start_x, region_end_x, region_start_y, region_end_y, region_start_z, region_end_z = self.region
+        return (region_start_x <= start_x and end_x <= region_end_x and
+                region_start_y <= start_y and end_y <= region_end_y and
+                region_start_z <= start_z and end_z <= region_end_z)
+
+    def check_collision_at(self, level, min_x: float, max_x: float, min_y: float, max_y: float, min_z: float, max_z: float):
+        # Same result as level.check_collision_at, for a level already passed to prepare this tick
+        start_x = int(min_x) - 1
+        end_x = int(max_x) + 1
+        start_y = int(min_y)
+        end_y = int(max_y)
+        start_z = int(min_z) - 1
+        end_z = int(max_z) + 1
+
+        if not self.covers(start_x, end_x, start_y, end_y, start_z, end_z):
+            self.gather(level, min_x, max_x, min_y, max_y, min_z, max_z)
+
+        for i, (box_min_x, box_max_x, box_min_y, box_max_y, box_min_z, box_max_z) in enumerate(self.bounds):
+            if not (min_x < box_max_x and max_x > box_min_x and
+                    min_y < box_max_y and max_y > box_min_y and
+                    min_z < box_max_z and max_z > box_min_z):
+                continue
+
+            cell_x, cell_y, cell_z = self.cells[i]
+            if start_x <= cell_x <= end_x and start_z <= cell_z <= end_z and start_y <= cell_y <= end_y:
+                return self.bboxes[i]
+
+        return None
@@ -0,0 +1,261 @@
+import math
+import numpy as np
+from .constants import *
+from .utils import ray_bbox_intersection, point_in_bbox
+
+class BoxTree:
+    # Static bounding volume hierarchy over every sub-box of the given blocks. Items are numbered
+    # in block order and then in get_bounding_box order, so the lowest item that matches a query is
+    # the one a scan over the blocks would find first. positions maps an item to its block's index.
+    def __init__(self, blocks: list, leaf_size: int = BVH_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.bboxes = []
+        self.blocks = []
+        self.positions = []
+        self.cells = []
+        self.blockage = []
+
+        for position, block in enumerate(blocks):
+            for bbox in block.get_bounding_box():
+                self.bboxes.append(bbox)
+                self.blocks.append(block)
+                self.positions.append(position)
+                self.cells.append((block.x, block.y, block.z))
+                self.blockage.append(block.blockage is not False)
+
+        self.bounds = [(bbox.min_x, bbox.max_x, bbox.min_y, bbox.max_y, bbox.min_z, bbox.max_z) for bbox in self.bboxes]
+
+        # Nodes are flat lists; a leaf has left == -1 and owns items[start:end], sorted ascending.
+        # first holds the lowest item below a node, which lets first-hit queries stop early.
+        self.node_bounds = []
+        self.left = []
+        self.right = []
+        self.start = []
+        self.end = []
+        self.first = []
+        self.items = []
+
+        if self.bounds:
+            self.build(np.arange(len(self.bounds)), np.array(self.bounds, dtype=np.float64))
+
+    def build(self, indices: np.ndarray, boxes: np.ndarray) -> int:
+        node = len(self.left)
+        bounds = boxes[indices]
+        self.node_bounds.append((bounds[:, 0].min(), bounds[:, 1].max(), bounds[:, 2].min(),
+                                 bounds[:, 3].max(), bounds[:, 4].min(), bounds[:, 5].max()))
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(0)
+        self.end.append(0)
+        self.first.append(int(indices.min()))
+
+        if len(indices) <= self.leaf_size:
+            self.start[node] = len(self.items)
+            self.items.extend(sorted(indices.tolist()))
+            self.end[node] = len(self.items)
+            return node
+
+        # Median split along the axis where the box centers spread the most
+        centers = (bounds[:, 0::2] + bounds[:, 1::2]) / 2
+        axis = int(np.argmax(centers.max(axis=0) - centers.min(axis=0)))
+        order = np.argsort(centers[:, axis], kind='stable')
+        half = len(indices) // 2
+
+        self.left[node] = self.build(indices[order[:half]], boxes)
+        self.right[node] = self.build(indices[order[half:]], boxes)
+        return node
+
+    def first_collision(self, min_x, max_x, min_y, max_y, min_z, max_z, start_x, end_x, start_y, end_y, start_z, end_z):
+        # Lowest solid item intersecting the box whose block cell lies in the given area, or -1
+        if not self.node_bounds:
+            return -1
+
+        best = len(self.bounds)
+        stack = [0]
+
+        while stack:
+            node = stack.pop()
+            if self.first[node] >= best:
+                continue
+
+            node_min_x, node_max_x, node_min_y, node_max_y, node_min_z, node_max_z = self.node_bounds[node]
+            if not (min_x < node_max_x and max_x > node_min_x and
+                    min_y < node_max_y and max_y > node_min_y and
+                    min_z < node_max_z and max_z > node_min_z):
+                continue
+
+            left = self.left[node]
+            if left >= 0:
+                right = self.right[node]
+                # Visit the subtree holding lower items last pushed, so first
+                if self.first[left] < self.first[right]:
+                    stack.append(right)
+                    stack.append(left)
+                else:
+                    stack.append(left)
+                    stack.append(right)
+                continue
+
+            for item in self.items[self.start[node]:self.end[node]]:
+                if item >= best:
+                    break
+
+                if not self.blockage[item]:
+                    continue
+
+                box_min_x, box_max_x, box_min_y, box_max_y, box_min_z, box_max_z = self.bounds[item]
+                if not (min_x < box_max_x and max_x > box_min_x and
+                        min_y < box_max_y and max_y > box_min_y and
+                        min_z < box_max_z and max_z > box_min_z):
+                    continue
+
+                cell_x, cell_y, cell_z = self.cells[item]
+                if start_x <= cell_x <= end_x and start_z <= cell_z <= end_z and start_y <= cell_y <= end_y:
+                    best = item
+                    break
+
+        if best == len(self.bounds):
+            return -1
+
+        return best
+
+    def closest_ray_hit(self, x, y, z, height, dir_x, dir_y, dir_z, start_x, end_x, start_y, end_y, start_z, end_z):
+        # Same result as Level.normal_raycast over the solid blocks in the given area
+        closest_hit = MAX_RAYCAST_DISTANCE
+        hit = False
+        if not self.node_bounds:
+            return hit, closest_hit
+
+        inv_x = 1.0 / dir_x if dir_x != 0 else math.inf
+        inv_z = 1.0 / dir_z if dir_z != 0 else math.inf
+
+        # Nodes are visited nearest first and skipped once their entry distance, a lower bound
+        # of any hit inside them, cannot beat the closest hit so far
+        near = self.get_entry_distance(0, x, z, dir_x, dir_z, inv_x, inv_z)
+        stack = [(near, 0)] if near is not None else []
+
+        while stack:
+            near, node = stack.pop()
+            if near >= closest_hit:
+                continue
+
+            left = self.left[node]
+            if left >= 0:
+                right = self.right[node]
+                near_left = self.get_entry_distance(left, x, z, dir_x, dir_z, inv_x, inv_z)
+                near_right = self.get_entry_distance(right, x, z, dir_x, dir_z, inv_x, inv_z)
+                if near_left is None:
+                    if near_right is not None:
+                        stack.append((near_right, right))
+                elif near_right is None:
+                    stack.append((near_left, left))
+                elif near_left <= near_right:
+                    stack.append((near_right, right))
+                    stack.append((near_left, left))
+                else:
+                    stack.append((near_left, left))
+                    stack.append((near_right, right))
+                continue
+
+            for item in self.items[self.start[node]:self.end[node]]:
+                if not self.blockage[item]:
+                    continue
+
+                cell_x, cell_y, cell_z = self.cells[item]
+                if not (start_x <= cell_x <= end_x and start_z <= cell_z <= end_z and start_y <= cell_y <= end_y):
+                    continue
+
+                box_min_x, box_max_x, box_min_y, box_max_y, box_min_z, box_max_z = self.bounds[item]
+                hit_distance = ray_bbox_intersection(x, y, z, dir_x, dir_y, dir_z,
+                                                     box_min_x, box_max_x, box_min_y, box_max_y, box_min_z, box_max_z, height)
+
+                if hit_distance is not None and hit_distance < closest_hit:
+                    closest_hit = hit_distance
+                    hit = True
+
+        return hit, closest_hit
+
+    def get_entry_distance(self, node, x, z, dir_x, dir_z, inv_x, inv_z):
+        # Distance at which the ray enters the node's x/z footprint, None when it never does.
+        # With no movement on an axis the ray is always or never inside that slab, which keeps
+        # 0 * inf out of the bounds
+        node_min_x, node_max_x, _, _, node_min_z, node_max_z = self.node_bounds[node]
+
+        if dir_x > 0:
+            near = (node_min_x - x) * inv_x
+            far = (node_max_x - x) * inv_x
+        elif dir_x < 0:
+            near = (node_max_x - x) * inv_x
+            far = (node_min_x - x) * inv_x
+        elif node_min_x <= x <= node_max_x:
+            near = -math.inf
+            far = math.inf
+        else:
+            return None
+
+        if dir_z > 0:
+            near_z = (node_min_z - z) * inv_z
+            far_z = (node_max_z - z) * inv_z
+        elif dir_z < 0:
+            near_z = (node_max_z - z) * inv_z
+            far_z = (node_min_z - z) * inv_z
+        elif node_min_z <= z <= node_max_z:
+            near_z = -math.inf
+            far_z = math.inf
+        else:
+            return None
+
+        if near_z > near:
+            near = near_z
+        if far_z < far:
+            far = far_z
+
+        if far < 0 or near > far:
+            return None
+
+        return near
+
+    def first_block_at(self, x, z, height):
+        # Lowest item containing (x, z), tested like point_in_bbox at y = 0, or -1
+        if not self.node_bounds:
+            return -1
+
+        best = len(self.bounds)
+        stack = [0]
+
+        while stack:
+            node = stack.pop()
+            if self.first[node] >= best:
+                continue
+
+            node_min_x, node_max_x, node_min_y, node_max_y, node_min_z, node_max_z = self.node_bounds[node]
+            if not (node_min_x <= x <= node_max_x and node_min_z <= z <= node_max_z):
+                continue
+            if height == 0 and not node_min_y <= 0 <= node_max_y:
+                continue
+            if height != 0 and not (0 <= node_max_y and height >= node_min_y):
+                continue
+
+            left = self.left[node]
+            if left >= 0:
+                right = self.right[node]
+                if self.first[left] < self.first[right]:
+                    stack.append(right)
+                    stack.append(left)
+                else:
+                    stack.append(left)
+                    stack.append(right)
+                continue
+
+            for item in self.items[self.start[node]:self.end[node]]:
+                if item >= best:
+                    break
+
+                if point_in_bbox(x, 0, z, self.bboxes[item], height):
+                    best = item
+                    break
+
+        if best == len(self.bounds):
+            return -1
+
+        return best
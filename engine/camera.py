@@ -3,10 +3,12 @@ from numpy import float32 as fl
 import math
 
 class Camera:
-    def __init__(self, x: float, z: float, rotation: float):
+    def __init__(self, x: float, z: float, rotation: float, center: tuple = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)):
         self.x = x
         self.z = z
         self.rotation = rotation
+        # Pixel (x, y) the camera position maps to
+        self.center_x, self.center_y = center
         
     def rotate(self, direction: int, dt: float):
         self.rotation += CAMERA_ROTATION_SPEED * direction * dt
@@ -47,14 +49,14 @@ class Camera:
             rotated_x = rel_x
             rotated_z = rel_z
         
-        screen_x = SCREEN_WIDTH // 2 + int(rotated_x * BLOCK_SIZE)
-        screen_y = SCREEN_HEIGHT // 2 + int(rotated_z * BLOCK_SIZE)
+        screen_x = self.center_x + int(rotated_x * BLOCK_SIZE)
+        screen_y = self.center_y + int(rotated_z * BLOCK_SIZE)
         
         return screen_x, screen_y
 
     def screen_to_world(self, screen_x, screen_y):
-        rel_x = (screen_x - SCREEN_WIDTH // 2) / BLOCK_SIZE
-        rel_z = (screen_y - SCREEN_HEIGHT // 2) / BLOCK_SIZE
+        rel_x = (screen_x - self.center_x) / BLOCK_SIZE
+        rel_z = (screen_y - self.center_y) / BLOCK_SIZE
         
         if self.rotation != 0:
             cos_angle = math.cos(-self.rotation)
@@ -0,0 +1,236 @@
+import bisect
+import math
+from collections import OrderedDict
+import numpy as np
+from .constants import *
+from .bvh import BoxTree
+from .level_file import create_blocks
+
+def get_chunk_key(x: int, z: int) -> tuple:
+    return x // CHUNK_SIZE, z // CHUNK_SIZE
+
+class Chunk:
+    # The blocks of one CHUNK_SIZE x CHUNK_SIZE column, kept as (order, block) in level order
+    def __init__(self, key: tuple, entries: list):
+        self.key = key
+        self.orders = []
+        self.blocks = []
+        self.block_index = {}
+        self.tree = None
+
+        for order, block in entries:
+            self.add(order, block)
+
+    def add(self, order: int, block):
+        self.orders.append(order)
+        self.blocks.append(block)
+        self.block_index.setdefault((block.x, block.y, block.z), []).append((order, block))
+        self.tree = None
+
+    def get_block(self, order: int):
+        return self.blocks[bisect.bisect_left(self.orders, order)]
+
+    def get_tree(self) -> BoxTree:
+        if self.tree is None:
+            self.tree = BoxTree(self.blocks)
+
+        return self.tree
+
+    def count_cells(self, start_x: int, end_x: int, start_y: int, end_y: int, start_z: int, end_z: int) -> int:
+        return max(end_x - start_x + 1, 0) * max(end_y - start_y + 1, 0) * max(end_z - start_z + 1, 0)
+
+    def first_collision(self, min_x, max_x, min_y, max_y, min_z, max_z, start_x, end_x, start_y, end_y, start_z, end_z):
+        # (order, bbox) of the first solid block in the area intersecting the box, or None.
+        # Scanning is cheaper than walking the box tree when the chunk holds few blocks.
+        if self.count_cells(start_x, end_x, start_y, end_y, start_z, end_z) < len(self.blocks):
+            tree = self.get_tree()
+            item = tree.first_collision(min_x, max_x, min_y, max_y, min_z, max_z, start_x, end_x, start_y, end_y, start_z, end_z)
+            if item < 0:
+                return None
+            return self.orders[tree.positions[item]], tree.bboxes[item]
+
+        for order, block in zip(self.orders, self.blocks):
+            if block.blockage is False:
+                continue
+            if not (start_x <= block.x <= end_x and start_z <= block.z <= end_z and start_y <= block.y <= end_y):
+                continue
+
+            for bbox in block.get_bounding_box():
+                if (min_x < bbox.max_x and max_x > bbox.min_x and
+                    min_y < bbox.max_y and max_y > bbox.min_y and
+                    min_z < bbox.max_z and max_z > bbox.min_z):
+                    return order, bbox
+
+        return None
+
+    def get_entries_in_area(self, start_x: int, end_x: int, start_y: int, end_y: int, start_z: int, end_z: int) -> list:
+        if self.count_cells(start_x, end_x, start_y, end_y, start_z, end_z) >= len(self.blocks):
+            return [(order, block) for order, block in zip(self.orders, self.blocks)
+                    if start_x <= block.x <= end_x and start_z <= block.z <= end_z and start_y <= block.y <= end_y]
+
+        entries = []
+        for x in range(start_x, end_x + 1):
+            for y in range(start_y, end_y + 1):
+                for z in range(start_z, end_z + 1):
+                    cell = self.block_index.get((x, y, z))
+                    if cell is not None:
+                        entries.extend(cell)
+
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def first_block_at(self, x, z, height):
+        # (order, block) of the first block with a sub-box containing (x, z), or None
+        tree = self.get_tree()
+        item = tree.first_block_at(x, z, height)
+        if item < 0:
+            return None
+
+        return self.orders[tree.positions[item]], tree.blocks[item]
+
+class ChunkedBlocks:
+    # Level.blocks split into column chunks. Blocks of the compiled level table are only created
+    # when a query first touches their chunk, and chunks are dropped again, least recently used
+    # first, once more than RESIDENT_BLOCK_BUDGET blocks are resident. Blocks appended after the
+    # table have nothing to be reloaded from and stay resident. Indexing by order and iterating
+    # work like the plain list; iterating does not load chunks.
+    def __init__(self, table: dict = None, budget: int = RESIDENT_BLOCK_BUDGET):
+        self.table = table
+        self.num_table_blocks = 0 if table is None else len(table["block_types"])
+        self.budget = budget
+        self.added = []
+        self.added_chunks = {}
+        self.resident = OrderedDict()
+        self.resident_blocks = 0
+        self.empty = set()
+        self.prefetched = None
+
+    def __len__(self) -> int:
+        return self.num_table_blocks + len(self.added)
+
+    def __getitem__(self, order: int):
+        if order < 0:
+            order += len(self)
+        if not 0 <= order < len(self):
+            raise IndexError("block order out of range")
+
+        if order >= self.num_table_blocks:
+            return self.added[order - self.num_table_blocks]
+
+        x, _, z = self.table["block_cells"][order].tolist()
+        return self.get_chunk(get_chunk_key(x, z)).get_block(order)
+
+    def __iter__(self):
+        # Resident chunks hand out their own blocks, the others are created on the fly and not kept
+        step = CHUNK_SIZE * CHUNK_SIZE
+        for start in range(0, self.num_table_blocks, step):
+            end = min(start + step, self.num_table_blocks)
+            created = None
+
+            for i, (x, _, z) in enumerate(self.table["block_cells"][start:end].tolist()):
+                chunk = self.resident.get(get_chunk_key(x, z))
+                if chunk is not None:
+                    yield chunk.get_block(start + i)
+                    continue
+
+                if created is None:
+                    created = create_blocks(self.table["block_types"][start:end], self.table["block_cells"][start:end],
+                                            self.table["block_blockage"][start:end], self.table["block_connections"][start:end])
+                yield created[i]
+
+        yield from self.added
+
+    def append(self, block):
+        order = len(self)
+        key = get_chunk_key(block.x, block.z)
+        self.added.append(block)
+        self.added_chunks.setdefault(key, []).append((order, block))
+        self.empty.discard(key)
+
+        if key in self.resident:
+            self.resident[key].add(order, block)
+            self.resident_blocks += 1
+
+    def get_cells(self) -> np.ndarray:
+        cells = [(block.x, block.y, block.z) for block in self.added]
+        cells = np.array(cells, dtype=np.int64).reshape(-1, 3)
+        if self.table is None:
+            return cells
+
+        return np.concatenate([np.asarray(self.table["block_cells"], dtype=np.int64), cells])
+
+    def get_chunk(self, key: tuple) -> Chunk:
+        chunk = self.resident.get(key)
+        if chunk is not None:
+            self.resident.move_to_end(key)
+            return chunk
+
+        if key in self.empty:
+            return None
+
+        return self.load_chunk(key)
+
+    def get_chunks(self, start_x: int, end_x: int, start_z: int, end_z: int) -> list:
+        # Chunks holding blocks in the cell area, loading the ones that are not resident
+        chunks = []
+        for chunk_x in range(start_x // CHUNK_SIZE, end_x // CHUNK_SIZE + 1):
+            for chunk_z in range(start_z // CHUNK_SIZE, end_z // CHUNK_SIZE + 1):
+                chunk = self.get_chunk((chunk_x, chunk_z))
+                if chunk is not None:
+                    chunks.append(chunk)
+
+        return chunks
+
+    def get_table_rows(self, key: tuple) -> np.ndarray:
+        if self.table is None or len(self.table["chunk_ids"]) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        chunk_id = key[0] * 2**32 + key[1]
+        chunk_ids = self.table["chunk_ids"]
+        index = int(np.searchsorted(chunk_ids, chunk_id))
+        if index == len(chunk_ids) or chunk_ids[index] != chunk_id:
+            return np.zeros(0, dtype=np.int64)
+
+        offsets = self.table["chunk_offsets"]
+        return np.asarray(self.table["chunk_rows"][offsets[index]:offsets[index + 1]])
+
+    def load_chunk(self, key: tuple) -> Chunk:
+        rows = self.get_table_rows(key)
+        added = self.added_chunks.get(key, [])
+
+        if len(rows) == 0 and not added:
+            # Queries keep asking about the empty chunks around the player
+            if len(self.empty) > 4096:
+                self.empty.clear()
+            self.empty.add(key)
+            return None
+
+        table = self.table
+        blocks = [] if len(rows) == 0 else create_blocks(table["block_types"][rows], table["block_cells"][rows],
+                                                         table["block_blockage"][rows], table["block_connections"][rows])
+        chunk = Chunk(key, list(zip(rows.tolist(), blocks)) + added)
+
+        self.resident[key] = chunk
+        self.resident_blocks += len(chunk.blocks)
+        self.evict()
+
+        return chunk
+
+    def evict(self):
+        # The most recently used chunk always stays, even when it alone is over the budget
+        while self.resident_blocks > self.budget and len(self.resident) > 1:
+            _, chunk = self.resident.popitem(last=False)
+            self.resident_blocks -= len(chunk.blocks)
+            self.prefetched = None
+
+    def prefetch(self, x: float, z: float, radius: int):
+        # Loads the chunks within radius chunks of (x, z) before a query needs them. Called every
+        # tick, so it only looks them up again once the player enters another chunk or one was evicted.
+        chunk_x, chunk_z = get_chunk_key(math.floor(x), math.floor(z))
+        if self.prefetched == (chunk_x, chunk_z, radius):
+            return
+
+        self.prefetched = (chunk_x, chunk_z, radius)
+        for offset_x in range(-radius, radius + 1):
+            for offset_z in range(-radius, radius + 1):
+                self.get_chunk((chunk_x + offset_x, chunk_z + offset_z))
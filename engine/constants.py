@@ -4,13 +4,21 @@ from numpy import float32 as fl
 SCREEN_WIDTH = 1480
 SCREEN_HEIGHT = 900
 TICK_RATE = 20
+PACING_MULTIPLIER = 4.0
+MAX_CATCH_UP_TICKS = 5
 BLOCK_SIZE = 50
 FONT = 'Minecraft Regular'
 INFO_PANEL_WIDTH = 220
 INFO_PANEL_PRECISION = 6
+STATIC_LAYER_PADDING = 512
+RENDER_CACHE_SIZE = 512
+SPECTATOR_NAME = 'vector_spectator'
+SPECTATOR_RING_SIZE = 256
+SPECTATOR_FPS = 60
 
 # Game settings
 PAUSE = False
+HEADLESS = False
 CENTER_CAMERA_ON_PLAYER = True
 LOOK_AT_CURSOR = True
 TOGGLE_SPRINT = True
@@ -56,4 +64,25 @@ RAYCAST_NUMBER = 16
 MAX_RAYCAST_DISTANCE = 10.0
 INVERTED_RAYCAST_STEP = 0.0001
 MACRO_SAVING_INTERVALS = 5000
-MACRO_NAME = '4b'
\ No newline at end of file
+MACRO_NAME = '4b'
+MACRO_CAPACITY = 72000
+RECORD_MACROS = True
+MACRO_QUEUE_SIZE = 64
+MACRO_WRITE_BATCH = 16
+GROUND_FIELD = False
+GROUND_FIELD_RESOLUTION = 0.05
+BLOCKAGE_RAYS = False
+START_STATE_POOL = False
+START_STATE_POOL_SIZE = 4096
+START_MOMENTUM_TICKS = 0
+START_FACING_SPREAD = 180.0
+
+# Levels
+LEVEL_DIRECTORY = 'levels'
+LEVEL = 'test'
+MAX_MERGED_BOXES = 16
+BVH_LEAF_SIZE = 4
+CHUNK_SIZE = 16
+CHUNK_LOAD_RADIUS = 1
+RESIDENT_BLOCK_BUDGET = 200000
+BROADPHASE_MARGIN = 2
\ No newline at end of file
@@ -1,29 +1,39 @@
-import pygame
+from .lazy import pygame
 from .constants import *
 from .player import Player
 from .camera import Camera
 from .level import Level
+from .render_cache import render_cache
+from .spectator import SpectatorPublisher
+from .pacing import Pacer, PacingMode
+from .macro import macro_writer
 from numpy import float32 as fl
 import time
 import math
-import os
-import csv
 
 class Engine:    
-    def __init__(self):
-        pygame.init()
-        pygame.display.set_caption("Vector Engine")
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.clock = pygame.time.Clock()
+    def __init__(self, spectator: str = None, headless: bool = HEADLESS, pacing: int = PacingMode.REALTIME):
+        # A headless engine never initializes pygame: no window, fonts, clock or event pump,
+        # and drawing only feeds the spectator publisher
+        self.headless = headless
+        self.screen = None
+        self.clock = None
+        self.font = None
+        if not headless:
+            pygame.init()
+            pygame.display.set_caption("Vector Engine")
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.clock = pygame.time.Clock()
+            self.font = render_cache.get_font(FONT, 16)
+
         self.running = True
         self.player = Player()
         self.camera = Camera(0, 0, math.radians(180))
         self.level = Level()
-        self.font = pygame.font.SysFont(FONT, 16)
         self.fps = 0
         self.fps_samples = []
         self.max_samples = 10
-        self.tick_rate = 1000
+        self.pacer = Pacer(pacing)
         self.do_draw = False
         self.last_player = None
         self.recent_attempts = []
@@ -31,8 +41,16 @@ class Engine:
         self.offset_x = -999.0
         self.offset_z = -999.0
         self.total_offset = -999.0
+
+        # Publishes every drawn frame for an out-of-process viewer, see engine.spectator
+        self.publisher = None
+        if spectator is not None:
+            self.publisher = SpectatorPublisher(spectator, self.level.path)
     
     def handle_events(self):
+        if self.headless:
+            return
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
@@ -43,21 +61,12 @@ class Engine:
                 if event.key == pygame.K_r:
                     self.player.set_position()
                 if event.key == pygame.K_t:
-                    if self.tick_rate == TICK_RATE:
-                        self.tick_rate = 1000
-                    else:
-                        self.tick_rate = TICK_RATE
+                    self.toggle_pacing()
                 if event.key == pygame.K_y:
                     self.do_draw = not self.do_draw
 
     def handle_input(self, dt: float):
         keys = pygame.key.get_pressed()
-        
-        if keys[pygame.K_t]:
-            if self.tick_rate == TICK_RATE:
-                self.tick_rate = 1000
-            else:
-                self.tick_rate = TICK_RATE
 
         # if keys[pygame.K_RIGHT]:
         #     self.camera.move_right(1, dt)
@@ -82,12 +91,16 @@ class Engine:
         self.player.set_movement(keys[pygame.K_w], keys[pygame.K_a], keys[pygame.K_s], keys[pygame.K_d])
 
     def tick(self):
+        self.level.update_chunks(self.player.x, self.player.z)
         self.player.tick(self.level, self.camera)
         self.last_player = self.player
         self.check_offset()
     
     def draw(self, active_keys = {}, ai_info = []):
-        if not self.do_draw:
+        if self.publisher is not None:
+            self.publisher.publish(self.player, active_keys, ai_info)
+
+        if self.headless or not self.do_draw:
             return
         
         self.screen.fill(BACKGROUND_COLOR)
@@ -113,11 +126,11 @@ class Engine:
         info_lines = self.player.get_info_text()
         info_lines.insert(0, f"FPS: {self.fps}")
         for i, line in enumerate(info_lines):
-            text_surface = self.font.render(line, True, TEXT_COLOR)
+            text_surface = render_cache.render_text(self.font, line, TEXT_COLOR)
             self.screen.blit(text_surface, (panel_x + padding, panel_y + padding + i * line_height))
             
         for i, line in enumerate(ai_info):
-            text_surface = self.font.render(line, True, TEXT_COLOR)
+            text_surface = render_cache.render_text(self.font, line, TEXT_COLOR)
             self.screen.blit(text_surface, (panel_x + padding, panel_y + padding + (i + 12) * line_height))
             
     def draw_keystrokes(self, active_keys = {}):
@@ -153,24 +166,18 @@ class Engine:
             'sprint': {'label': 'sprint', 'width': key_size, 'height': key_size},
         }
         
-        font = pygame.font.Font(None, 24)
+        font = render_cache.get_font(None, 24)
                         
         for key, pos in key_positions.items():
             key_data = key_info[key]
-            width = key_data['width']
-            height = key_data['height']
-            label = key_data['label']
 
             # Determine color based on whether the key is active
             color = active_color if active_keys[key] else inactive_color
             
-            # Draw the rectangle
-            pygame.draw.rect(self.screen, color, (pos[0], pos[1], width, height))
-            
-            # Render the text
-            text_surface = font.render(label, True, active_color)
-            text_rect = text_surface.get_rect(center=(pos[0] + width / 2, pos[1] + height / 2))
-            self.screen.blit(text_surface, text_rect)
+            # The key's rectangle and label, rendered once per color
+            key_surface = render_cache.get_key_surface(font, key_data['label'], key_data['width'], key_data['height'],
+                                                       color, active_color)
+            self.screen.blit(key_surface, pos)
             
     def draw_recent_attempts(self, attempts):
         start_x = SCREEN_WIDTH - 100
@@ -183,9 +190,31 @@ class Engine:
             text_surface = self.font.render(line, True, TEXT_COLOR)
             self.screen.blit(text_surface, (start_x, start_y + (i + 12) * line_height))
             
-    def reset(self):
-        self.player.set_position()
-        self.player.reset_macro()
+    def close(self):
+        macro_writer.flush()
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
+
+    def reset(self, start_state=None):
+        # start_state is a StartStatePool record; saved macros replay from its position and facing.
+        # Either way nothing the first tick reads is left over from the last episode.
+        player = self.player
+        if start_state is None:
+            player.set_position()
+            player.prev_slip = None
+            player.prev_sprint = False
+            player.jump_height = player.y
+        else:
+            x, y, z = start_state["position"].tolist()
+            f = start_state["facing"]
+            player.set_position(x, y, z, f)
+            player.vx, player.vy, player.vz = start_state["velocity"].tolist()
+            player.prev_slip = fl(start_state["prev_slip"])
+            player.prev_sprint = bool(start_state["prev_sprint"])
+            player.jump_height = float(start_state["jump_height"])
+            player.spawn_x, player.spawn_y, player.spawn_z, player.spawn_f = x, y, z, f
+        player.reset_macro()
         self.offset_x = -999.0
         self.offset_z = -999.0
         self.total_offset = -999.0
@@ -215,49 +244,21 @@ class Engine:
         return self.player.facing
     
     def save_macro(self, name, iteration):
-        if not self.player.macro:
+        if len(self.player.macro) == 0:
             print("Macro buffer is empty. Skipping save.")
             return
 
-        filename = f"{name}_{iteration}.csv"
-        filepath = os.path.join("macros", filename)
-        os.makedirs("macros", exist_ok=True)
-
-        header = [
-            "X", "Y", "Z", "YAW", "PITCH", "ANGLE_X", "ANGLE_Y",
-            "W", "A", "S", "D", "SPRINT", "SNEAK", "JUMP", "LMB", "RMB",
-            "VEL_X", "VEL_Y", "VEL_Z"
-        ]
-
-        try:
-            with open(filepath, 'w', newline='') as f:
-                writer = csv.writer(f)
-                
-                # Write the spawn coordinates on the first line
-                spawn_coords = [
-                    self.player.spawn_x,
-                    self.player.spawn_y,
-                    self.player.spawn_z,
-                    self.player.spawn_f
-                ]
-                writer.writerow(spawn_coords)
-                
-                # Write the header
-                writer.writerow(header)
-                
-                # Write the macro data
-                for row in self.player.macro:
-                    writer.writerow(row)
-            
-            print("Macro data saved successfully.")
-        except IOError as e:
-            print(f"Error saving macro data: {e}")
-
-        self.player.macro = []
+        spawn_coords = [self.player.spawn_x, self.player.spawn_y, self.player.spawn_z, self.player.spawn_f]
+        macro_writer.enqueue(name, iteration, spawn_coords, self.player.macro.get_frames())
+        self.player.macro.reset()
     
     def raycast(self, x: float, y: float, z: float, height: float, angle: float, inverted: bool = True) -> float:
         return self.level.raycast(x, y, z, height, angle, self.screen, self.camera, inverted)
     
+    def raycast_batch(self, x: float, y: float, z: float, height: float, dir_x, dir_z, inverted: bool = True):
+        surface = self.screen if self.do_draw and not self.headless else None
+        return self.level.raycast_batch(x, y, z, height, dir_x, dir_z, surface, self.camera, inverted)
+    
     def check_offset(self):
         start_x, _, start_z = self.level.get_start_bounds().get_center()
         
@@ -299,34 +300,35 @@ class Engine:
         # if keys['space']:
         #     self.player.jump()
             
+    def toggle_pacing(self):
+        if self.pacer.mode == PacingMode.REALTIME:
+            self.pacer.set_mode(PacingMode.UNTHROTTLED)
+        else:
+            self.pacer.set_mode(PacingMode.REALTIME)
+
     def run(self):
         frame_count = 0
         fps_update_interval = 0.5
         fps_timer = 0
         
-        tick_interval = 1.0 / TICK_RATE
-        accumulator = 0.0
-        previous_time = time.time()
+        previous_time = time.perf_counter()
         
         self.player = Player(0.5, 11, -0.29999, 0)
         
         while self.running:
-            current_time = time.time()
+            current_time = time.perf_counter()
             dt = current_time - previous_time
             previous_time = current_time
             
             if dt > 0.25:
                 dt = 0.25
-                
-            accumulator += dt
             
             self.handle_events()
             self.handle_input(dt)
             
-            while accumulator >= tick_interval:
+            for _ in range(self.pacer.get_due_ticks()):
                 if not PAUSE:
                     self.tick()
-                accumulator -= tick_interval
             
             self.draw()
             
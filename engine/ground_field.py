@@ -0,0 +1,170 @@
+import math
+import os
+import hashlib
+import zipfile
+import numpy as np
+from .constants import *
+from .level import Level
+from .level_file import save_compiled_level
+
+class GroundField:
+    def __init__(self, level: Level, dir_x, dir_z, height: float, resolution: float = GROUND_FIELD_RESOLUTION):
+        self.level = level
+        self.dir_x = np.asarray(dir_x, dtype=np.float64)
+        self.dir_z = np.asarray(dir_z, dtype=np.float64)
+        self.height = height
+        self.resolution = resolution
+        self.bands = {}
+        self.fields = np.zeros((0, 0, 0, len(self.dir_x)), dtype=np.float32)
+        self.origin_x = 0.0
+        self.origin_z = 0.0
+
+    @classmethod
+    def load(cls, level: Level, dir_x, dir_z, height: float, resolution: float = GROUND_FIELD_RESOLUTION):
+        field = cls(level, dir_x, dir_z, height, resolution)
+        path = level.get_cache_path("ground")
+        fingerprint = field.get_fingerprint()
+
+        if path is not None and os.path.exists(path) and field.load_cache(path, fingerprint):
+            return field
+
+        field.build()
+
+        if path is not None:
+            save_compiled_level(path, {
+                "fingerprint": fingerprint, "fields": field.fields, "origin": np.array([field.origin_x, field.origin_z]),
+                "bands": np.array(sorted(field.bands, key=field.bands.get), dtype=np.int64).reshape(-1, 2),
+            })
+
+        return field
+
+    def load_cache(self, path: str, fingerprint: str) -> bool:
+        # A cache that can not be read, like one a crashed worker left half written, is a miss
+        # and gets rebuilt
+        try:
+            with np.load(path) as cache:
+                if str(cache["fingerprint"]) != fingerprint:
+                    return False
+
+                fields = cache["fields"]
+                bands = {tuple(band): i for i, band in enumerate(cache["bands"].tolist())}
+                origin_x, origin_z = cache["origin"].tolist()
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return False
+
+        self.fields = fields
+        self.bands = bands
+        self.origin_x, self.origin_z = origin_x, origin_z
+        return True
+
+    def get_fingerprint(self) -> str:
+        voxels, origin = self.level.get_voxel_grid()
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(voxels >= 0).tobytes())
+        digest.update(repr((voxels.shape, origin, self.height, self.resolution, MAX_RAYCAST_DISTANCE)).encode())
+        digest.update(self.dir_x.tobytes())
+        digest.update(self.dir_z.tobytes())
+        return digest.hexdigest()
+
+    def get_walkable_bands(self):
+        # Column bands (lowest and highest y cell) the ray sees while the player stands on a
+        # block top or is in the air up to one block above it
+        tops = sorted(set((self.level.blocks.get_cells()[:, 1] + 1).tolist()))
+        bands = []
+
+        for top in tops:
+            for player_y in (top, top + 0.5, top + 1.1):
+                band = (math.floor(player_y - self.height), math.floor(player_y))
+                if band not in bands:
+                    bands.append(band)
+
+        return bands
+
+    def build(self):
+        bands = self.get_walkable_bands()
+
+        # Outside the level's footprint plus one cell there is no ground and every ray reads 0
+        cells = self.level.blocks.get_cells()[:, 0::2].astype(np.float64)
+        if len(cells) == 0:
+            return
+
+        self.origin_x, self.origin_z = (cells.min(axis=0) - 1).tolist()
+        size_x, size_z = ((cells.max(axis=0) + 2 - cells.min(axis=0) + 1) / self.resolution).astype(int) + 1
+
+        fields = np.zeros((len(bands), size_x, size_z, len(self.dir_x)), dtype=np.float32)
+        row_z = np.repeat(self.origin_z + np.arange(size_z) * self.resolution, len(self.dir_x))
+        row_dir_x = np.tile(self.dir_x, size_z)
+        row_dir_z = np.tile(self.dir_z, size_z)
+
+        # One row of sample points along z per call, every ray of every point at once
+        for i, (min_cell_y, max_cell_y) in enumerate(bands):
+            for grid_x in range(size_x):
+                x = self.origin_x + grid_x * self.resolution
+                _, distances = self.level.column_raycast_batch(x, row_z, min_cell_y, max_cell_y, row_dir_x, row_dir_z)
+                fields[i, grid_x] = distances.reshape(size_z, len(self.dir_x))
+
+        self.fields = fields
+        self.bands = {band: i for i, band in enumerate(bands)}
+
+    def lookup(self, x: float, y: float, z: float) -> np.ndarray:
+        # Bilinear read of the baked rays for an origin at (x, y, z); None when y is not in a baked band
+        band = self.bands.get((math.floor(y), math.floor(y + self.height)))
+        if band is None:
+            return None
+
+        _, size_x, size_z, num_rays = self.fields.shape
+        grid_x = (x - self.origin_x) / self.resolution
+        grid_z = (z - self.origin_z) / self.resolution
+        cell_x = math.floor(grid_x)
+        cell_z = math.floor(grid_z)
+
+        if not (0 <= cell_x < size_x - 1 and 0 <= cell_z < size_z - 1):
+            return np.zeros(num_rays, dtype=np.float32)
+
+        fraction_x = grid_x - cell_x
+        fraction_z = grid_z - cell_z
+        corners = self.fields[band, cell_x:cell_x + 2, cell_z:cell_z + 2]
+
+        near = corners[0, 0] * (1 - fraction_z) + corners[0, 1] * fraction_z
+        far = corners[1, 0] * (1 - fraction_z) + corners[1, 1] * fraction_z
+        return (near * (1 - fraction_x) + far * fraction_x).astype(np.float32)
+
+    def lookup_batch(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        # lookup for many origins at once. Returns (rays, found): rows whose y is not in a baked
+        # band are left zero with found False
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        z = np.asarray(z, dtype=np.float64)
+        num_bands, size_x, size_z, num_rays = self.fields.shape
+        rays = np.zeros((len(x), num_rays), dtype=np.float32)
+
+        band = np.full(len(x), -1)
+        keys = np.stack([np.floor(y), np.floor(y + self.height)], axis=1).astype(np.int64)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        for i, key in enumerate(unique_keys.tolist()):
+            band[inverse.ravel() == i] = self.bands.get(tuple(key), -1)
+
+        found = band >= 0
+        grid_x = (x - self.origin_x) / self.resolution
+        grid_z = (z - self.origin_z) / self.resolution
+        cell_x = np.floor(grid_x).astype(np.int64)
+        cell_z = np.floor(grid_z).astype(np.int64)
+        inside = found & (cell_x >= 0) & (cell_x < size_x - 1) & (cell_z >= 0) & (cell_z < size_z - 1)
+        if not inside.any():
+            return rays, found
+
+        # Fractions are rounded to float32 first, as the scalar lookup's Python floats are when
+        # they meet the float32 field
+        rows = np.nonzero(inside)[0]
+        band, cell_x, cell_z = band[rows], cell_x[rows], cell_z[rows]
+        fraction_x = (grid_x[rows] - cell_x)[:, None]
+        fraction_z = (grid_z[rows] - cell_z)[:, None]
+        fields = self.fields
+
+        near = (fields[band, cell_x, cell_z] * (1 - fraction_z).astype(np.float32) +
+                fields[band, cell_x, cell_z + 1] * fraction_z.astype(np.float32))
+        far = (fields[band, cell_x + 1, cell_z] * (1 - fraction_z).astype(np.float32) +
+               fields[band, cell_x + 1, cell_z + 1] * fraction_z.astype(np.float32))
+        rays[rows] = near * (1 - fraction_x).astype(np.float32) + far * fraction_x.astype(np.float32)
+
+        return rays, found
@@ -0,0 +1,19 @@
+import importlib
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access, so a headless process
+    # that never draws never imports it
+    def __init__(self, name: str):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute: str):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+
+        return getattr(self.module, attribute)
+
+# Only needed for drawing and spectating
+pygame = LazyModule("pygame")
+shared_memory = LazyModule("multiprocessing.shared_memory")
+resource_tracker = LazyModule("multiprocessing.resource_tracker")
@@ -1,4 +1,5 @@
-import pygame
+from __future__ import annotations
+from .lazy import pygame
 from .blocks.stone import StoneBlock
 from .blocks.glass_pane import GlassPane, Connection
 from .constants import *
@@ -6,7 +7,11 @@ from .camera import Camera
 from .bounding_box import BoundingBox
 import numpy as np
 import math
+import os
 from .utils import *
+from .level_file import *
+from .chunks import ChunkedBlocks
+from .render_cache import render_cache
 
 class LandingMode:
     NORMAL = 1
@@ -15,22 +20,60 @@ class LandingMode:
     ENTER = 4
 
 class Level:
-    def __init__(self):
-        self.blocks = []
+    def __init__(self, path: str = None):
+        self.name = None
+        self.path = None
+        self.blocks = ChunkedBlocks()
+        self.voxels = None
+        self.voxel_origin = (0, 0, 0)
+        self.collision_boxes = None
+        self.collision_orders = None
+        self.merged_boxes = None
         self.start_bounds = None
         self.goal_x = 0.0
         self.goal_y = 0.0
         self.goal_z = 0.0
         self.landing_mode = LandingMode.NORMAL
-        self.test()
-        self.coordinates_font = pygame.font.SysFont(FONT, 14)
+        self.static_layer = None
+        self.static_layer_camera = None
+        self.load(path if path is not None else get_level_path(LEVEL))
 
     def draw(self, surface: pygame.Surface, camera: Camera):
+        # The level never changes while it is drawn, so it is rendered once to the static layer
+        # and only blitted at the camera's offset until the rotation changes or the view leaves it
+        layer, offset = self.get_static_layer(surface, camera)
+        surface.blit(layer, offset)
+
+    def get_static_layer(self, surface: pygame.Surface, camera: Camera):
+        if self.static_layer is not None and self.static_layer_camera.rotation == camera.rotation:
+            offset = self.get_static_layer_offset(camera)
+            if (offset[0] <= 0 and offset[0] + self.static_layer.get_width() >= surface.get_width() and
+                offset[1] <= 0 and offset[1] + self.static_layer.get_height() >= surface.get_height()):
+                return self.static_layer, offset
+
+        width = surface.get_width() + 2 * STATIC_LAYER_PADDING
+        height = surface.get_height() + 2 * STATIC_LAYER_PADDING
+        self.static_layer_camera = Camera(camera.x, camera.z, camera.rotation, (width // 2, height // 2))
+        self.static_layer = pygame.Surface((width, height), 0, surface)
+        self.static_layer.fill(BACKGROUND_COLOR)
+        self.draw_static(self.static_layer, self.static_layer_camera)
+
+        return self.static_layer, self.get_static_layer_offset(camera)
+
+    def get_static_layer_offset(self, camera: Camera):
+        # Where the layer's top left corner lands on screen: its camera position maps to its center
+        layer_camera = self.static_layer_camera
+        screen_x, screen_y = camera.world_to_screen(layer_camera.x, layer_camera.z)
+        return screen_x - layer_camera.center_x, screen_y - layer_camera.center_y
+
+    def draw_static(self, surface: pygame.Surface, camera: Camera):
+        width = surface.get_width()
+        height = surface.get_height()
         screen_corners_world = [
             camera.screen_to_world(-BLOCK_SIZE, -BLOCK_SIZE),
-            camera.screen_to_world(SCREEN_WIDTH + BLOCK_SIZE, -BLOCK_SIZE),
-            camera.screen_to_world(SCREEN_WIDTH + BLOCK_SIZE, SCREEN_HEIGHT + BLOCK_SIZE),
-            camera.screen_to_world(-BLOCK_SIZE, SCREEN_HEIGHT + BLOCK_SIZE)
+            camera.screen_to_world(width + BLOCK_SIZE, -BLOCK_SIZE),
+            camera.screen_to_world(width + BLOCK_SIZE, height + BLOCK_SIZE),
+            camera.screen_to_world(-BLOCK_SIZE, height + BLOCK_SIZE)
         ]
         
         world_x_coords = [corner[0] for corner in screen_corners_world]
@@ -58,8 +101,8 @@ class Level:
             
         if DRAW_GOAL_BOUNDS:
             screen_x, screen_y = camera.world_to_screen(self.goal_x, self.goal_z)
-            pygame.draw.line(surface, GOAL_BOUNDS_COLOR, (screen_x, 0), (screen_x, SCREEN_HEIGHT), 1) 
-            pygame.draw.line(surface, GOAL_BOUNDS_COLOR, (0, screen_y), (SCREEN_WIDTH, screen_y), 1) 
+            pygame.draw.line(surface, GOAL_BOUNDS_COLOR, (screen_x, 0), (screen_x, height), 1) 
+            pygame.draw.line(surface, GOAL_BOUNDS_COLOR, (0, screen_y), (width, screen_y), 1) 
             
     def draw_bounds(self, bounds: BoundingBox, color, surface: pygame.Surface, camera: Camera):
         corners_world = [
@@ -73,7 +116,7 @@ class Level:
         
         on_screen = False
         for screen_x, screen_y in corners_screen:
-            if (0 <= screen_x < SCREEN_WIDTH and 0 <= screen_y < SCREEN_HEIGHT):
+            if (0 <= screen_x < surface.get_width() and 0 <= screen_y < surface.get_height()):
                 on_screen = True
                 break
         
@@ -94,14 +137,15 @@ class Level:
             pygame.draw.line(surface, GRID_COLOR, start_screen, end_screen, 1)
 
     def draw_coordinates(self, surface: pygame.Surface, camera: Camera, blocks):
+        font = render_cache.get_font(FONT, 14)
         for block in blocks:
             center_screen = camera.world_to_screen(block.x+0.5, block.z+0.5)
             
-            if not (0 <= center_screen[0] < SCREEN_WIDTH and 0 <= center_screen[1] < SCREEN_HEIGHT):
+            if not (0 <= center_screen[0] < surface.get_width() and 0 <= center_screen[1] < surface.get_height()):
                 continue
             
             coord_text = f"{int(block.x)},{int(block.z)}"
-            text_surface = self.coordinates_font.render(coord_text, True, (200, 200, 200))
+            text_surface = render_cache.render_text(font, coord_text, (200, 200, 200))
             
             text_x = center_screen[0] - text_surface.get_width() // 2
             text_y = center_screen[1] - text_surface.get_height() // 2
@@ -109,21 +153,28 @@ class Level:
             surface.blit(text_surface, (text_x, text_y))
             
     def check_collision(self, bounding_box: BoundingBox) -> BoundingBox:
-        blocks = self.get_blocks_in_area(int(bounding_box.min_x)-1, int(bounding_box.max_x)+1,
-                                         int(bounding_box.min_y), int(bounding_box.max_y),
-                                         int(bounding_box.min_z)-1, int(bounding_box.max_z)+1)
-        
-        for block in blocks:
-            if block.blockage is False:
-                continue
-            
-            block_bboxes = block.get_bounding_box()
-            
-            for bbox in block_bboxes:
-                if self.bbox_intersect(bounding_box, bbox):
-                    return bbox
-            
-        return None
+        return self.check_collision_at(bounding_box.min_x, bounding_box.max_x,
+                                       bounding_box.min_y, bounding_box.max_y,
+                                       bounding_box.min_z, bounding_box.max_z)
+
+    def check_collision_at(self, min_x: float, max_x: float, min_y: float, max_y: float, min_z: float, max_z: float) -> BoundingBox:
+        # Same candidate area and block order as get_blocks_in_area, without building the list
+        start_x = int(min_x) - 1
+        end_x = int(max_x) + 1
+        start_y = int(min_y)
+        end_y = int(max_y)
+        start_z = int(min_z) - 1
+        end_z = int(max_z) + 1
+
+        # Blocks only ever sit in one chunk, so the earliest hit over the chunks is the first hit
+        closest_bbox = None
+        closest_order = len(self.blocks)
+        for chunk in self.blocks.get_chunks(start_x, end_x, start_z, end_z):
+            hit = chunk.first_collision(min_x, max_x, min_y, max_y, min_z, max_z, start_x, end_x, start_y, end_y, start_z, end_z)
+            if hit is not None and hit[0] < closest_order:
+                closest_order, closest_bbox = hit
+
+        return closest_bbox
 
     def bbox_intersect(self, bbox1: BoundingBox, bbox2: BoundingBox) -> bool:
         return (bbox1.min_x < bbox2.max_x and 
@@ -134,9 +185,102 @@ class Level:
                 bbox1.max_z > bbox2.min_z)
 
     def get_blocks_in_area(self, start_x: int, end_x: int, start_y: int, end_y: int, start_z: int, end_z: int):
-        return [block for block in self.blocks 
-                if start_x <= block.x <= end_x and start_z <= block.z <= end_z and start_y <= block.y <= end_y]
+        chunks = self.blocks.get_chunks(start_x, end_x, start_z, end_z)
+        if len(chunks) == 1:
+            return [block for _, block in chunks[0].get_entries_in_area(start_x, end_x, start_y, end_y, start_z, end_z)]
+
+        entries = []
+        for chunk in chunks:
+            entries.extend(chunk.get_entries_in_area(start_x, end_x, start_y, end_y, start_z, end_z))
+
+        entries.sort(key=lambda entry: entry[0])
+        return [block for _, block in entries]
+
+    def count_cells(self, start_x: int, end_x: int, start_y: int, end_y: int, start_z: int, end_z: int) -> int:
+        return max(end_x - start_x + 1, 0) * max(end_y - start_y + 1, 0) * max(end_z - start_z + 1, 0)
+
+    def add_block(self, block):
+        self.blocks.append(block)
+        self.voxels = None
+        self.collision_boxes = None
+        self.collision_orders = None
+        self.merged_boxes = None
+        self.static_layer = None
+        
+    def update_chunks(self, x: float, z: float):
+        self.blocks.prefetch(x, z, CHUNK_LOAD_RADIUS)
+            
+    def get_collision_boxes(self):
+        if self.collision_boxes is None:
+            self.compile_collision_boxes()
+        
+        return self.collision_boxes
+    
+    def compile_collision_boxes(self):
+        boxes = []
+        cells = []
+        orders = []
+
+        for order, block in enumerate(self.blocks):
+            if block.blockage is False:
+                continue
+
+            for bbox in block.get_bounding_box():
+                boxes.append((bbox.min_x, bbox.max_x, bbox.min_y, bbox.max_y, bbox.min_z, bbox.max_z))
+                cells.append((block.x, block.y, block.z))
+                orders.append(order)
+
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 6)
+        cells = np.array(cells, dtype=np.int64).reshape(-1, 3)
+
+        self.collision_boxes = (boxes, cells)
+        self.collision_orders = np.array(orders, dtype=np.int64)
+        
+    def get_merged_boxes(self):
+        if self.merged_boxes is None:
+            self.compile_merged_boxes()
+            
+        return self.merged_boxes
+    
+    def compile_merged_boxes(self):
+        # Greedily joins collision boxes that share a whole face, along x, then z, then y, up to
+        # MAX_MERGED_BOXES members each.
+        # A merged box is exactly the union of its members (rows of get_collision_boxes, -1 padded),
+        # so queries test the merged boxes first and only the members of the ones they touch
+        boxes, _ = self.get_collision_boxes()
+        merged = [(box, [index]) for index, box in enumerate(boxes.tolist())]
+        
+        for low, high in ((0, 1), (4, 5), (2, 3)):
+            others = [axis for axis in range(6) if axis not in (low, high)]
+            merged.sort(key=lambda entry: ([entry[0][axis] for axis in others], entry[0][low]))
             
+            joined = []
+            for box, members in merged:
+                if joined:
+                    last_box, last_members = joined[-1]
+                    if (last_box[high] == box[low] and all(last_box[axis] == box[axis] for axis in others) and
+                        len(last_members) + len(members) <= MAX_MERGED_BOXES):
+                        last_box[high] = box[high]
+                        last_members.extend(members)
+                        continue
+                        
+                joined.append((list(box), list(members)))
+            merged = joined
+            
+        width = max((len(members) for _, members in merged), default=0)
+        members = np.full((len(merged), width), -1, dtype=np.int64)
+        for i, (_, box_members) in enumerate(merged):
+            members[i, :len(box_members)] = sorted(box_members)
+            
+        self.merged_boxes = (np.array([box for box, _ in merged], dtype=np.float64).reshape(-1, 6), members)
+        
+    def get_merged_blocks(self, index: int) -> list:
+        # Source blocks of one merged box, in level order, e.g. to draw them
+        self.get_collision_boxes()
+        _, members = self.get_merged_boxes()
+        orders = self.collision_orders[members[index][members[index] >= 0]]
+        return [self.blocks[order] for order in np.unique(orders).tolist()]
+
     def get_start_bounds(self) -> BoundingBox:
         return self.start_bounds
     
@@ -149,11 +293,29 @@ class Level:
         end_z = z + dir_z * MAX_RAYCAST_DISTANCE
 
         if not inverted:
-            blocks = self.get_blocks_along_ray(x, y, z, end_x, y + height, end_z)
-            hit, closest_hit = self.normal_raycast(x, y, z, height, dir_x, dir_y, dir_z, blocks)
+            hit, closest_hit = self.normal_raycast(x, y, z, height, dir_x, dir_y, dir_z)
         else:
             hit, closest_hit = self.inverted_raycast(x, y, z, height, dir_x, dir_y, dir_z, 0)
         
+        if surface is not None:
+            self.draw_raycast(surface, camera, x, z, dir_x, dir_z, hit, closest_hit, inverted)
+            
+        return closest_hit
+    
+    def raycast_batch(self, x: float, y: float, z: float, height: float, dir_x: np.ndarray, dir_z: np.ndarray,
+                      surface: pygame.Surface = None, camera: Camera = None, inverted: bool = False) -> np.ndarray:
+        if not inverted:
+            hits, distances = self.normal_raycast_batch(x, y, z, height, dir_x, dir_z)
+        else:
+            hits, distances = self.inverted_raycast_batch(x, y, z, height, dir_x, dir_z)
+            
+        if surface is not None:
+            for i in range(len(distances)):
+                self.draw_raycast(surface, camera, x, z, dir_x[i], dir_z[i], hits[i], distances[i], inverted)
+                
+        return distances
+    
+    def draw_raycast(self, surface: pygame.Surface, camera: Camera, x, z, dir_x, dir_z, hit, closest_hit, inverted):
         if DRAW_RAYCAST_LINES:
             player_x, player_y = camera.world_to_screen(x, z)
             screen_x, screen_y = camera.world_to_screen(x + dir_x * closest_hit, z + dir_z * closest_hit)
@@ -180,10 +342,24 @@ class Level:
                             (screen_x + cross_size, screen_y - cross_size),
                             (screen_x - cross_size, screen_y + cross_size),
                             thickness)
-            
-        return closest_hit
     
-    def normal_raycast(self, x, y, z, height, dir_x, dir_y, dir_z, blocks):
+    def normal_raycast(self, x, y, z, height, dir_x, dir_y, dir_z, blocks = None):
+        if blocks is None:
+            # The chunk box trees restricted to the area get_blocks_along_ray would gather
+            end_x = x + dir_x * MAX_RAYCAST_DISTANCE
+            end_z = z + dir_z * MAX_RAYCAST_DISTANCE
+            area = (int(min(x, end_x)), int(max(x, end_x)), int(y), int(y + height), int(min(z, end_z)), int(max(z, end_z)))
+            
+            hit = False
+            closest_hit = MAX_RAYCAST_DISTANCE
+            for chunk in self.blocks.get_chunks(area[0], area[1], area[4], area[5]):
+                chunk_hit, chunk_closest_hit = chunk.get_tree().closest_ray_hit(x, y, z, height, dir_x, dir_y, dir_z, *area)
+                if chunk_hit and chunk_closest_hit < closest_hit:
+                    hit = True
+                    closest_hit = chunk_closest_hit
+                    
+            return hit, closest_hit
+        
         closest_hit = MAX_RAYCAST_DISTANCE
         hit = False
         
@@ -205,32 +381,192 @@ class Level:
         return hit, closest_hit
     
     def inverted_raycast(self, x, y, z, height, dir_x, dir_y, dir_z, distance):
-        if distance > MAX_RAYCAST_DISTANCE:
-            return False, MAX_RAYCAST_DISTANCE
+        # Walks the columns under the ray one cell boundary at a time (Amanatides-Woo)
+        # until it reaches a column with no block between y and y + height
+        voxels, (origin_x, origin_y, origin_z) = self.get_voxel_grid()
+        size_x, size_y, size_z = voxels.shape
+        start_y = max(math.floor(y) - origin_y, 0)
+        end_y = min(math.floor(y + height) - origin_y + 1, size_y)
         
-        block = self.get_block_at(x, y, z, height)
+        x = float(x)
+        z = float(z)
+        cell_x = math.floor(x)
+        cell_z = math.floor(z)
+        step_x = 1 if dir_x > 0 else -1 if dir_x < 0 else 0
+        step_z = 1 if dir_z > 0 else -1 if dir_z < 0 else 0
         
-        if block is None:
-            return True, distance
+        # Next cell boundary ahead on each axis and the ray distance at which it is crossed
+        boundary_x = cell_x + 1 if dir_x > 0 else cell_x
+        boundary_z = cell_z + 1 if dir_z > 0 else cell_z
+        start = distance
+        next_x = start + (boundary_x - x) / dir_x if dir_x != 0 else math.inf
+        next_z = start + (boundary_z - z) / dir_z if dir_z != 0 else math.inf
         
-        for bbox in block.get_bounding_box():
-            exit_point = find_exit_point(x, y, z, dir_x, dir_y, dir_z, bbox)
-            if exit_point is None:
-                continue
+        while distance <= MAX_RAYCAST_DISTANCE:
+            grid_x = cell_x - origin_x
+            grid_z = cell_z - origin_z
+            ground = False
+            if 0 <= grid_x < size_x and 0 <= grid_z < size_z:
+                for grid_y in range(start_y, end_y):
+                    if voxels.item(grid_x, grid_y, grid_z) >= 0:
+                        ground = True
+                        break
             
-            next_x = exit_point[0] + dir_x * INVERTED_RAYCAST_STEP
-            next_y = exit_point[1] + dir_y * INVERTED_RAYCAST_STEP
-            next_z = exit_point[2] + dir_z * INVERTED_RAYCAST_STEP
-                        
-            return self.inverted_raycast(next_x, next_y, next_z, height, dir_x, dir_y, dir_z, distance + exit_point[3])
+            if not ground:
+                return True, distance
+            
+            if next_x < next_z:
+                distance = next_x
+                cell_x += step_x
+                boundary_x += step_x
+                next_x = start + (boundary_x - x) / dir_x
+            else:
+                distance = next_z
+                cell_z += step_z
+                boundary_z += step_z
+                next_z = start + (boundary_z - z) / dir_z if dir_z != 0 else math.inf
+                
+        return False, MAX_RAYCAST_DISTANCE
+    
+    def inverted_raycast_batch(self, x, y, z, height, dir_x: np.ndarray, dir_z: np.ndarray):
+        return self.column_raycast_batch(x, z, math.floor(y), math.floor(y + height), dir_x, dir_z)
+    
+    def column_raycast_batch(self, x, z, min_cell_y: int, max_cell_y: int, dir_x: np.ndarray, dir_z: np.ndarray):
+        # Same traversal as inverted_raycast for every ray at once: all boundary crossings
+        # within range are merged per ray, z before x on ties, and the columns looked up in one gather.
+        # x and z are one origin for all rays or one origin per ray
+        voxels, (origin_x, origin_y, origin_z) = self.get_voxel_grid()
+        size_x, size_y, size_z = voxels.shape
+        start_y = max(min_cell_y - origin_y, 0)
+        end_y = min(max_cell_y - origin_y + 1, size_y)
+        
+        dir_x = np.asarray(dir_x, dtype=np.float64)
+        dir_z = np.asarray(dir_z, dtype=np.float64)
+        num_rays = len(dir_x)
+        x = np.broadcast_to(np.asarray(x, dtype=np.float64), dir_x.shape)
+        z = np.broadcast_to(np.asarray(z, dtype=np.float64), dir_z.shape)
+        cell_x = np.floor(x).astype(np.int64)
+        cell_z = np.floor(z).astype(np.int64)
+        
+        crossings = np.arange(int(MAX_RAYCAST_DISTANCE) + 2)
+        distances_x, steps_x = self.get_boundary_crossings(x, cell_x, dir_x, crossings)
+        distances_z, steps_z = self.get_boundary_crossings(z, cell_z, dir_z, crossings)
+        
+        distances = np.concatenate([distances_z, distances_x], axis=1)
+        crosses_x = np.concatenate([np.zeros_like(distances_z, dtype=bool), np.ones_like(distances_x, dtype=bool)], axis=1)
+        order = np.argsort(distances, axis=1, kind='stable')
+        distances = np.take_along_axis(distances, order, axis=1)
+        crosses_x = np.take_along_axis(crosses_x, order, axis=1)
+        
+        # Cell entered after each crossing, with the starting cell in front
+        zeros = np.zeros((num_rays, 1))
+        distances = np.concatenate([zeros, distances], axis=1)
+        cells_x = cell_x[:, None] + steps_x[:, None] * np.concatenate([zeros, np.cumsum(crosses_x, axis=1)], axis=1).astype(np.int64)
+        cells_z = cell_z[:, None] + steps_z[:, None] * np.concatenate([zeros, np.cumsum(~crosses_x, axis=1)], axis=1).astype(np.int64)
+        
+        grid_x = cells_x - origin_x
+        grid_z = cells_z - origin_z
+        inside = (grid_x >= 0) & (grid_x < size_x) & (grid_z >= 0) & (grid_z < size_z)
+        ground = np.zeros(inside.shape, dtype=bool)
+        if end_y > start_y:
+            columns = voxels[grid_x[inside][:, None], np.arange(start_y, end_y), grid_z[inside][:, None]]
+            ground[inside] = (columns >= 0).any(axis=1)
+            
+        edge = ~ground & (distances <= MAX_RAYCAST_DISTANCE)
+        hits = edge.any(axis=1)
+        first = edge.argmax(axis=1)
+        distances = np.where(hits, distances[np.arange(num_rays), first], MAX_RAYCAST_DISTANCE)
+        
+        return hits, distances
+    
+    def get_boundary_crossings(self, origin: np.ndarray, cell: np.ndarray, direction: np.ndarray, crossings: np.ndarray):
+        steps = np.sign(direction).astype(np.int64)
+        boundaries = np.where(direction > 0, cell + 1, cell)[:, None] + steps[:, None] * crossings
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = (boundaries - origin[:, None]) / direction[:, None]
+        distances[direction == 0] = np.inf
         
-        return False, 0
+        return distances, steps
+    
+    def normal_raycast_batch(self, x, y, z, height, dir_x: np.ndarray, dir_z: np.ndarray):
+        dir_x = np.asarray(dir_x, dtype=np.float64)
+        dir_z = np.asarray(dir_z, dtype=np.float64)
+        end_x = x + dir_x * MAX_RAYCAST_DISTANCE
+        end_z = z + dir_z * MAX_RAYCAST_DISTANCE
+        num_rays = len(dir_x)
+        hits = np.zeros(num_rays, dtype=bool)
+        distances = np.full(num_rays, MAX_RAYCAST_DISTANCE)
+        
+        boxes, cells = self.get_collision_boxes()
+        merged, members = self.get_merged_boxes()
+        if len(merged) == 0:
+            return hits, distances
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_x = np.where(dir_x != 0, 1.0 / np.where(dir_x != 0, dir_x, 1.0), np.inf)
+            inv_z = np.where(dir_z != 0, 1.0 / np.where(dir_z != 0, dir_z, 1.0), np.inf)
+            
+            # A ray segment reaching a member also reaches the merged box around it, NaNs count as reaching
+            _, t_min, t_max = self.get_slab_distances(x, z, inv_x[:, None], inv_z[:, None], merged[None])
+            touched = ~(t_max < 0) & ~(t_min > t_max) & ~(t_min >= MAX_RAYCAST_DISTANCE)
+            
+            ray_index, merged_index = np.nonzero(touched)
+            candidates = members[merged_index]
+            ray_index = np.repeat(ray_index, candidates.shape[1])
+            candidates = candidates.ravel()
+            ray_index = ray_index[candidates >= 0]
+            candidates = candidates[candidates >= 0]
             
+            # Each ray keeps to the blocks its own get_blocks_along_ray area would gather
+            candidate_cells = cells[candidates]
+            in_area = ((np.trunc(np.minimum(x, end_x))[ray_index] <= candidate_cells[:, 0]) &
+                       (candidate_cells[:, 0] <= np.trunc(np.maximum(x, end_x))[ray_index]) &
+                       (int(y) <= candidate_cells[:, 1]) & (candidate_cells[:, 1] <= int(y + height)) &
+                       (np.trunc(np.minimum(z, end_z))[ray_index] <= candidate_cells[:, 2]) &
+                       (candidate_cells[:, 2] <= np.trunc(np.maximum(z, end_z))[ray_index]))
+            
+            hit_distance, t_min, t_max = self.get_slab_distances(x, z, inv_x[ray_index], inv_z[ray_index], boxes[candidates])
+            valid = in_area & ~(t_max < 0) & ~(t_min > t_max) & (hit_distance < MAX_RAYCAST_DISTANCE)
+        
+        np.minimum.at(distances, ray_index[valid], hit_distance[valid])
+        hits[ray_index[valid]] = True
+        
+        return hits, distances
+    
+    def get_slab_distances(self, x, z, inv_x: np.ndarray, inv_z: np.ndarray, boxes: np.ndarray):
+        # Slab test of ray_bbox_intersection, whose y slab always contains the ray. The
+        # comparisons mirror Python's min/max so NaNs from 0 * inf are handled the same way
+        t1 = (boxes[..., 0] - x) * inv_x
+        t2 = (boxes[..., 1] - x) * inv_x
+        t5 = (boxes[..., 4] - z) * inv_z
+        t6 = (boxes[..., 5] - z) * inv_z
+        
+        min_x = np.where(t2 < t1, t2, t1)
+        max_x = np.where(t2 > t1, t2, t1)
+        min_z = np.where(t6 < t5, t6, t5)
+        max_z = np.where(t6 > t5, t6, t5)
+        t_min = np.where(min_z > min_x, min_z, min_x)
+        t_max = np.where(max_z < max_x, max_z, max_x)
+        hit_distance = np.where(t_min < 0, t_max, t_min)
+        
+        return hit_distance, t_min, t_max
 
-    def find_adjacent_block(self, x, z, height, direction, blocks):        
+    def find_adjacent_block(self, x, z, height, direction, blocks = None):        
         search_x = x + direction[0]
         search_z = z + direction[1]
         
+        if blocks is None:
+            # Sub-boxes stay inside their block's cell, so only the cells around the point can hold one
+            closest = None
+            for chunk in self.blocks.get_chunks(math.floor(search_x) - 1, math.floor(search_x) + 1,
+                                                math.floor(search_z) - 1, math.floor(search_z) + 1):
+                found = chunk.first_block_at(search_x, search_z, height)
+                if found is not None and (closest is None or found[0] < closest[0]):
+                    closest = found
+                    
+            return None if closest is None else closest[1]
+        
         for block in blocks:
             for bbox in block.get_bounding_box():
                 if point_in_bbox(search_x, 0, search_z, bbox, height):
@@ -239,24 +575,57 @@ class Level:
         return None
     
     def get_block_at(self, x, y, z, height = 0):
-        if x < 0:
-            search_x = math.floor(x-1)
-        else:
-            search_x = math.floor(x)
-            
-        if z < 0:
-            search_z = math.floor(z-1)
-        else:
-            search_z = math.floor(z)
+        # The cell that contains the point, as in inverted_raycast: a block at cell x spans x to x + 1
+        search_x = math.floor(x)
+        search_z = math.floor(z)
         
         search_y_min = math.floor(y)
         search_y_max = math.floor(y+height)
         
-        for block in self.blocks:
-            if block.x == search_x and block.y >= search_y_min and block.y <= search_y_max and block.z == search_z:
-                return block
+        voxels, (origin_x, origin_y, origin_z) = self.get_voxel_grid()
+        size_x, size_y, size_z = voxels.shape
+        
+        grid_x = search_x - origin_x
+        grid_z = search_z - origin_z
+        if not (0 <= grid_x < size_x and 0 <= grid_z < size_z):
+            return None
+        
+        # The earliest block in the column wins, like the old scan over self.blocks
+        closest = -1
+        for grid_y in range(max(search_y_min - origin_y, 0), min(search_y_max - origin_y + 1, size_y)):
+            order = voxels.item(grid_x, grid_y, grid_z)
+            if order >= 0 and (closest < 0 or order < closest):
+                closest = order
+        
+        if closest < 0:
+            return None
             
-        return None
+        return self.blocks[closest]
+    
+    def get_voxel_grid(self):
+        if self.voxels is None:
+            self.compile_voxels()
+            
+        return self.voxels, self.voxel_origin
+    
+    def compile_voxels(self):
+        if not self.blocks:
+            self.voxels = np.full((0, 0, 0), -1, dtype=np.int32)
+            self.voxel_origin = (0, 0, 0)
+            return
+        
+        cells = self.blocks.get_cells()
+        origin = cells.min(axis=0)
+        cells -= origin
+        
+        # Each cell holds the index of its first block in self.blocks, or -1 when empty
+        empty = np.iinfo(np.int32).max
+        voxels = np.full(tuple(cells.max(axis=0) + 1), empty, dtype=np.int32)
+        np.minimum.at(voxels, (cells[:, 0], cells[:, 1], cells[:, 2]), np.arange(len(self.blocks), dtype=np.int32))
+        voxels[voxels == empty] = -1
+        
+        self.voxels = voxels
+        self.voxel_origin = tuple(int(value) for value in origin)
             
     def get_blocks_along_ray(self, start_x, start_y, start_z, end_x, end_y, end_z):
         min_x = min(start_x, end_x)
@@ -272,20 +641,62 @@ class Level:
             int(min_z), int(max_z)
         )
 
-    def test(self):
-        self.start_bounds = BoundingBox(1.299999, -0.299999, 11, 11, -0.299999, 2.699)
-        
-        self.goal_z = 6.3
-        self.goal_x = -0.3
-        self.goal_y = 11
-        self.landing_mode = LandingMode.Z_NEO
-        
-        self.blocks.append(StoneBlock(0, 10, 0))
-        self.blocks.append(StoneBlock(0, 10, 1))
-        self.blocks.append(StoneBlock(0, 10, 2))
-        self.blocks.append(StoneBlock(0, 12, 3))
-        self.blocks.append(StoneBlock(0, 12, 4))
-        self.blocks.append(StoneBlock(0, 12, 5))
-        self.blocks.append(StoneBlock(0, 10, 6))
-        self.blocks.append(StoneBlock(0, 10, 7))
-        self.blocks.append(StoneBlock(0, 10, 8))
+    def get_cache_path(self, kind: str) -> str:
+        # Derived data lives next to the level file, or in LEVEL_DIRECTORY for built-in levels
+        if self.path is not None:
+            return f"{os.path.splitext(self.path)[0]}.{kind}.npz"
+        
+        if self.name is None:
+            return None
+        
+        return os.path.join(LEVEL_DIRECTORY, f"{self.name}.{kind}.npz")
+
+    def load(self, path: str):
+        # Geometry comes from the compiled cache next to the level file when it is current,
+        # otherwise the level file is compiled once and the cache written for the next process
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        
+        fingerprint = get_level_fingerprint(path)
+        compiled = load_compiled_level(self.get_cache_path("level"), fingerprint)
+        
+        if compiled is not None:
+            self.load_compiled(compiled)
+            return
+        
+        compiled = compile_level_file(path)
+        self.load_compiled(compiled)
+        
+        voxels, voxel_origin = self.get_voxel_grid()
+        boxes, cells = self.get_collision_boxes()
+        compiled["fingerprint"] = np.array(fingerprint)
+        compiled["voxels"] = voxels
+        compiled["voxel_origin"] = np.array(voxel_origin, dtype=np.int64)
+        compiled["collision_boxes"] = boxes
+        compiled["collision_cells"] = cells
+        compiled["collision_orders"] = self.collision_orders
+        compiled["merged_boxes"], compiled["merged_members"] = self.get_merged_boxes()
+        save_compiled_level(self.get_cache_path("level"), compiled)
+        
+    def load_compiled(self, compiled: dict):
+        # Only the tables are read here; block objects are created chunk by chunk as queries reach them
+        if "chunk_ids" not in compiled:
+            compiled.update(get_chunk_table(compiled["block_cells"]))
+            
+        self.blocks = ChunkedBlocks(compiled)
+        self.voxels = None
+        self.collision_boxes = None
+        self.collision_orders = None
+        self.merged_boxes = None
+        self.static_layer = None
+        
+        self.start_bounds = BoundingBox(*compiled["start_bounds"].tolist())
+        self.goal_x, self.goal_y, self.goal_z = compiled["goal"].tolist()
+        self.landing_mode = getattr(LandingMode, str(compiled["landing_mode"]))
+        
+        if "voxels" in compiled:
+            self.voxels = compiled["voxels"]
+            self.voxel_origin = tuple(compiled["voxel_origin"].tolist())
+            self.collision_boxes = (compiled["collision_boxes"], compiled["collision_cells"])
+            self.collision_orders = compiled["collision_orders"]
+            self.merged_boxes = (compiled["merged_boxes"], compiled["merged_members"])
@@ -0,0 +1,158 @@
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+from .constants import *
+from .blocks.stone import StoneBlock
+from .blocks.glass_pane import GlassPane, Connection
+
+# Bump whenever the layout of the compiled cache changes
+LEVEL_FORMAT_VERSION = 3
+
+BLOCK_TYPES = ["stone", "glass_pane"]
+CONNECTIONS = ["POSITIVE_X", "NEGATIVE_X", "POSITIVE_Z", "NEGATIVE_Z"]
+
+LEVEL_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), LEVEL_DIRECTORY)
+
+def get_level_path(name: str) -> str:
+    return os.path.join(LEVEL_ROOT, f"{name}.json")
+
+def get_level_fingerprint(path: str) -> str:
+    # Size and modification time, so checking the cache stays cheap however large the level file is
+    stat = os.stat(path)
+    return f"{LEVEL_FORMAT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def read_level_file(path: str) -> dict:
+    # A level file is JSON:
+    # {
+    #     "start_bounds": [min_x, max_x, min_y, max_y, min_z, max_z],
+    #     "goal": [x, y, z],
+    #     "landing_mode": "Z_NEO",
+    #     "blocks": [{"type": "stone", "x": 0, "y": 10, "z": 0}, ...]
+    # }
+    # Blocks may set "blockage": false, glass panes may list "connections" by Connection name.
+    with open(path) as f:
+        source = json.load(f)
+
+    for key in ("start_bounds", "goal", "landing_mode", "blocks"):
+        if key not in source:
+            raise ValueError(f"Level file {path} is missing '{key}'")
+
+    if len(source["start_bounds"]) != 6 or len(source["goal"]) != 3:
+        raise ValueError(f"Level file {path} needs 6 start bound and 3 goal coordinates")
+
+    for block in source["blocks"]:
+        if block.get("type") not in BLOCK_TYPES:
+            raise ValueError(f"Level file {path} has unknown block type {block.get('type')!r}")
+        for connection in block.get("connections", []):
+            if connection not in CONNECTIONS:
+                raise ValueError(f"Level file {path} has unknown connection {connection!r}")
+
+    return source
+
+def compile_level_file(path: str) -> dict:
+    # The level file as arrays: one row per block (type index, cell, blockage, connection mask)
+    # plus start bounds, goal and the LandingMode name
+    source = read_level_file(path)
+    blocks = source["blocks"]
+
+    return {
+        "block_types": np.array([BLOCK_TYPES.index(block["type"]) for block in blocks], dtype=np.int8),
+        "block_cells": np.array([(block["x"], block["y"], block["z"]) for block in blocks], dtype=np.int64).reshape(-1, 3),
+        "block_blockage": np.array([block.get("blockage", True) for block in blocks], dtype=bool),
+        "block_connections": np.array([[name in block.get("connections", []) for name in CONNECTIONS] for block in blocks],
+                                      dtype=bool).reshape(-1, len(CONNECTIONS)),
+        "start_bounds": np.array(source["start_bounds"], dtype=np.float64),
+        "goal": np.array(source["goal"], dtype=np.float64),
+        "landing_mode": np.array(source["landing_mode"]),
+    }
+
+def get_chunk_table(cells: np.ndarray) -> dict:
+    # Block rows grouped by CHUNK_SIZE x CHUNK_SIZE column, in level order within a chunk.
+    # Chunk ids x * 2**32 + z sort like (x, z) and are searched in the sorted chunk_ids.
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    ids = (cells[:, 0] // CHUNK_SIZE) * 2**32 + cells[:, 2] // CHUNK_SIZE
+    rows = np.argsort(ids, kind="stable")
+    chunk_ids, starts = np.unique(ids[rows], return_index=True)
+
+    return {
+        "chunk_ids": chunk_ids.astype(np.int64),
+        "chunk_offsets": np.append(starts, len(rows)).astype(np.int64),
+        "chunk_rows": rows.astype(np.int64),
+    }
+
+def create_blocks(types: np.ndarray, cells: np.ndarray, blockage: np.ndarray, connections: np.ndarray) -> list:
+    blocks = []
+
+    for block_type, (x, y, z), block_blockage, mask in zip(types.tolist(), cells.tolist(), blockage.tolist(), connections.tolist()):
+        if BLOCK_TYPES[block_type] == "glass_pane":
+            # A fresh list each time, the default connections argument is shared between panes
+            pane_connections = [getattr(Connection, name) for name, connected in zip(CONNECTIONS, mask) if connected]
+            blocks.append(GlassPane(x, y, z, block_blockage, pane_connections))
+        else:
+            blocks.append(StoneBlock(x, y, z, block_blockage))
+
+    return blocks
+
+def save_compiled_level(path: str, arrays: dict):
+    # Stored uncompressed so load_compiled_level can map the members, and written to a
+    # temporary file first so workers racing to build the cache never read a partial one
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "wb") as f:
+        np.savez(f, **arrays)
+
+    os.replace(temporary_path, path)
+
+def load_compiled_level(path: str, fingerprint: str) -> dict:
+    # Maps every array of the cache read-only so all processes share the same pages.
+    # Returns None when there is no cache or it was compiled from another level file.
+    if path is None or not os.path.exists(path):
+        return None
+
+    try:
+        arrays = mmap_npz(path)
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+    if "fingerprint" not in arrays or str(arrays["fingerprint"]) != fingerprint:
+        return None
+
+    return arrays
+
+def mmap_npz(path: str) -> dict:
+    arrays = {}
+
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and can not be memory mapped")
+
+            # The member's data follows its local header, whose name and extra field lengths
+            # may differ from the central directory
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = os.path.splitext(info.filename)[0]
+            order = "F" if fortran_order else "C"
+
+            if dtype.hasobject:
+                raise ValueError(f"{path} holds object arrays")
+
+            if len(shape) == 0 or 0 in shape:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape, order=order)
+            else:
+                mapped = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order=order)
+                arrays[name] = mapped.view(np.ndarray)
+
+    return arrays
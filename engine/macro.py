@@ -0,0 +1,169 @@
+import os
+import csv
+import atexit
+import queue
+import threading
+import numpy as np
+from .constants import *
+
+MACRO_HEADER = [
+    "X", "Y", "Z", "YAW", "PITCH", "ANGLE_X", "ANGLE_Y",
+    "W", "A", "S", "D", "SPRINT", "SNEAK", "JUMP", "LMB", "RMB",
+    "VEL_X", "VEL_Y", "VEL_Z"
+]
+
+# Keys recorded per tick, in MACRO_HEADER order. A frame packs them into one byte, bit i set
+# when MACRO_KEYS[i] is held.
+MACRO_KEYS = ['W', 'A', 'S', 'D', 'sprint', 'sneak', 'space']
+
+# Pitch is float64 so a Python float facing delta formats exactly as it did as a string row
+MACRO_FRAME_DTYPE = np.dtype([
+    ("pitch", np.float64),
+    ("keys", np.uint8),
+])
+
+def macro_rows(frames: np.ndarray) -> list:
+    # The CSV rows of MACRO_FRAME_DTYPE frames
+    rows = []
+    for pitch, keys in zip(frames["pitch"].tolist(), frames["keys"].tolist()):
+        rows.append(["0.0", "0.0", "0.0", "0.0", "0.0", f"{pitch:.2f}", "0.0"] +
+                    ["true" if keys >> i & 1 else "false" for i in range(len(MACRO_KEYS))] +
+                    ["false", "false", "0.0", "0.0", "0.0"])
+
+    return rows
+
+def write_macro(name, iteration, spawn_coords, rows):
+    filename = f"{name}_{iteration}.csv"
+    filepath = os.path.join("macros", filename)
+    os.makedirs("macros", exist_ok=True)
+
+    try:
+        with open(filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            
+            # Write the spawn coordinates on the first line
+            writer.writerow(spawn_coords)
+            
+            # Write the header
+            writer.writerow(MACRO_HEADER)
+            
+            # Write the macro data
+            for row in rows:
+                writer.writerow(row)
+        
+        print("Macro data saved successfully.")
+    except IOError as e:
+        print(f"Error saving macro data: {e}")
+
+class MacroRecorder:
+    # Raw per-tick macro inputs in a preallocated buffer of capacity frames; rows are only formatted
+    # by macro_rows on export. A full buffer doubles instead of dropping the oldest frames, since a
+    # macro missing its start can not be replayed from its spawn.
+    def __init__(self, capacity: int = MACRO_CAPACITY):
+        self.allocate(capacity)
+        self.count = 0
+
+    def allocate(self, capacity: int):
+        self.frames = np.zeros(capacity, dtype=MACRO_FRAME_DTYPE)
+        self.pitch = self.frames["pitch"]
+        self.keys = self.frames["keys"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, pitch: float, keys: dict):
+        index = self.count
+        if index == len(self.frames):
+            frames = self.frames
+            self.allocate(max(2 * len(frames), 1))
+            self.frames[:index] = frames
+
+        self.pitch[index] = pitch
+        self.keys[index] = (keys['W'] | keys['A'] << 1 | keys['S'] << 2 | keys['D'] << 3 |
+                            keys['sprint'] << 4 | keys['sneak'] << 5 | keys['space'] << 6)
+        self.count += 1
+
+    def get_frames(self) -> np.ndarray:
+        return self.frames[:self.count].copy()
+
+    def reset(self):
+        self.count = 0
+
+class MacroWriter:
+    # Writes macros on a background thread so that saving one never holds up a step on disk.
+    # enqueue hands over a snapshot of the frames; CSV rows are formatted and written on the
+    # thread, which takes every macro waiting when it wakes (up to batch_size) and writes the
+    # batch at once, saves of the same name and iteration collapsing into the newest one since
+    # each would overwrite the file anyway. The queue is bounded: when it is full, enqueue waits
+    # for room. flush waits until everything queued is written, and close, also run at exit,
+    # drains the queue and stops the thread.
+    def __init__(self, queue_size: int = MACRO_QUEUE_SIZE, batch_size: int = MACRO_WRITE_BATCH):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.reset()
+        atexit.register(self.close)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        # A forked child inherits the writer but not its thread, and the macros still queued
+        # are the parent's to write
+        self.queue = queue.Queue(self.queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        with self.lock:
+            if not self.is_running():
+                self.thread = threading.Thread(target=self.run, name="macro-writer", daemon=True)
+                self.thread.start()
+
+    def enqueue(self, name, iteration, spawn_coords, frames: np.ndarray):
+        self.start()
+        self.queue.put((name, iteration, list(spawn_coords), frames.copy()))
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            jobs = {}
+            for job in batch:
+                if job is None:
+                    stop = True
+                else:
+                    jobs[job[:2]] = job
+
+            for name, iteration, spawn_coords, frames in jobs.values():
+                try:
+                    write_macro(name, iteration, spawn_coords, macro_rows(frames))
+                except Exception as e:
+                    print(f"Error saving macro data: {e}")
+
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        if self.is_running():
+            self.queue.join()
+
+    def close(self):
+        with self.lock:
+            thread = self.thread if self.is_running() else None
+            self.thread = None
+
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+macro_writer = MacroWriter()
@@ -0,0 +1,86 @@
+import math
+import struct
+import numpy as np
+from numpy import float32 as fl
+
+# Minecraft's MathHelper sine table, identical to what mcsin/mccos compute when ANGLES == 65536.
+# The angles are vectorized in the same double operation order as index * math.pi * 2.0 / 65536,
+# which rounds the same everywhere, but the sines come from math.sin: np.sin may take SIMD
+# paths that do not match libm on every CPU.
+SIN_TABLE = np.array(list(map(math.sin, (np.arange(65536) * math.pi * 2.0 / 65536).tolist())), dtype=fl)
+
+# Pre-boxed numpy scalars for callers that need the exact numpy float32 return type
+SIN_VALUES = list(SIN_TABLE)
+
+# Plain Python floats holding the same float32 values for the fast float path
+SIN_FLOATS = SIN_TABLE.tolist()
+
+SIN_SCALE = fl(10430.378)
+COS_OFFSET = fl(16384.0)
+
+_FLOAT32 = struct.Struct('f')
+_pack = _FLOAT32.pack
+_unpack = _FLOAT32.unpack
+
+def f32(x) -> float:
+    # Rounds to the nearest float32 and hands back a Python float. +, -, *, / and sqrt
+    # of float32 values done in double and rounded once by f32 equal the float32 result.
+    return _unpack(_pack(x))[0]
+
+SIN_SCALE_FLOAT = float(SIN_SCALE)
+COS_OFFSET_FLOAT = float(COS_OFFSET)
+
+def sin_float(rad: float) -> float:
+    index = int(f32(f32(rad) * SIN_SCALE_FLOAT)) & 65535
+    return SIN_FLOATS[index]
+
+def cos_float(rad: float) -> float:
+    index = int(f32(f32(f32(rad) * SIN_SCALE_FLOAT) + COS_OFFSET_FLOAT)) & 65535
+    return SIN_FLOATS[index]
+
+def sin_array(rad) -> np.ndarray:
+    index = (np.asarray(rad, dtype=fl) * SIN_SCALE).astype(np.int64) & 65535
+    return SIN_TABLE[index]
+
+def cos_array(rad) -> np.ndarray:
+    index = (np.asarray(rad, dtype=fl) * SIN_SCALE + COS_OFFSET).astype(np.int64) & 65535
+    return SIN_TABLE[index]
+
+def reference_sin(rad):
+    index = int(rad * fl(10430.378)) & 65535
+    return fl(math.sin(index * math.pi * 2.0 / 65536))
+
+def reference_cos(rad):
+    index = int(rad * fl(10430.378) + fl(16384.0)) & 65535
+    return fl(math.sin(index * math.pi * 2.0 / 65536))
+
+def check_sin_table() -> list[int]:
+    # Angles landing in the middle of every sin and every cos table index, plus their negatives
+    indices = np.arange(65536) + 0.5
+    angles = np.concatenate([indices, indices - 16384.0]) / SIN_SCALE_FLOAT
+    angles = np.concatenate([angles, -angles]).astype(fl)
+    sin_values = sin_array(angles)
+    cos_values = cos_array(angles)
+    mismatches = []
+
+    for index in range(65536):
+        expected = fl(math.sin(index * math.pi * 2.0 / 65536))
+        if SIN_TABLE[index] != expected or SIN_VALUES[index] != expected or SIN_FLOATS[index] != float(expected):
+            mismatches.append(index)
+
+    for i, rad in enumerate(angles.tolist()):
+        expected_sin = reference_sin(fl(rad))
+        expected_cos = reference_cos(fl(rad))
+        if sin_float(rad) != expected_sin or sin_values[i] != expected_sin:
+            mismatches.append(i)
+        if cos_float(rad) != expected_cos or cos_values[i] != expected_cos:
+            mismatches.append(i)
+
+    return mismatches
+
+if __name__ == "__main__":
+    mismatches = check_sin_table()
+    if mismatches:
+        print(f"Sine table parity failed at {len(mismatches)} indices: {mismatches[:10]}")
+    else:
+        print("Sine table parity OK for all 65536 indices")
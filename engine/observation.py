@@ -0,0 +1,51 @@
+import numpy as np
+from .constants import *
+
+# Navigation observation layout
+GOAL_DELTA = slice(0, 3)
+BLOCKAGE_RAY_SLICE = slice(3, 3 + RAYCAST_NUMBER)
+GROUND_RAY_SLICE = slice(3 + RAYCAST_NUMBER, 3 + 2 * RAYCAST_NUMBER)
+GROUND_DISTANCE = 3 + 2 * RAYCAST_NUMBER
+FACING = GROUND_DISTANCE + 1
+VELOCITY = slice(FACING + 1, FACING + 4)
+OBSERVATION_SIZE = FACING + 4
+
+class ObservationBuilder:
+    # Fills the navigation observation in place, straight from the engine's player and level.
+    # build returns a view of the step buffer that the next build overwrites; resets are built
+    # into a buffer of their own, so the terminal observation a vec env keeps across the reset
+    # that follows it stays intact. With blockage_rays False those rays are never cast and
+    # their slots stay zero.
+    def __init__(self, ray_dir_x: np.ndarray, ray_dir_z: np.ndarray, ground_field=None, blockage_rays: bool = BLOCKAGE_RAYS):
+        self.ray_dir_x = ray_dir_x
+        self.ray_dir_z = ray_dir_z
+        self.ground_field = ground_field
+        self.blockage_rays = blockage_rays
+        self.buffer = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+        self.reset_buffer = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+
+    def build(self, engine, reset: bool = False) -> np.ndarray:
+        observation = self.reset_buffer if reset else self.buffer
+        player = engine.player
+        level = engine.level
+        x, y, z = player.x, player.y, player.z
+
+        observation[0] = level.goal_x - x
+        observation[1] = level.goal_y - y
+        observation[2] = level.goal_z - z
+
+        if self.blockage_rays:
+            observation[BLOCKAGE_RAY_SLICE] = engine.raycast_batch(x, y, z, PLAYER_HEIGHT, self.ray_dir_x, self.ray_dir_z, inverted=False)
+
+        ground_rays = None
+        if self.ground_field is not None:
+            ground_rays = self.ground_field.lookup(x, y - 1.25, z)
+        if ground_rays is None:
+            ground_rays = engine.raycast_batch(x, y - 1.25, z, 1.25, self.ray_dir_x, self.ray_dir_z, inverted=True)
+        observation[GROUND_RAY_SLICE] = ground_rays
+
+        observation[GROUND_DISTANCE] = y - player.jump_height
+        observation[FACING] = player.facing
+        observation[VELOCITY] = (player.vx, player.vy, player.vz)
+
+        return observation
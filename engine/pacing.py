@@ -0,0 +1,69 @@
+import time
+from .constants import *
+
+class PacingMode:
+    REALTIME = 1
+    UNTHROTTLED = 2
+    MULTIPLIER = 3
+
+class Pacer:
+    # Spaces ticks out on the monotonic perf_counter clock: TICK_RATE ticks per second in
+    # REALTIME, multiplier times that in MULTIPLIER, and never waits in UNTHROTTLED. A caller
+    # that falls behind catches up by at most max_catch_up ticks, the rest of the backlog is
+    # dropped instead of being run in a burst.
+    def __init__(self, mode: int = PacingMode.REALTIME, tick_rate: float = TICK_RATE,
+                 multiplier: float = PACING_MULTIPLIER, max_catch_up: int = MAX_CATCH_UP_TICKS):
+        self.mode = mode
+        self.tick_rate = tick_rate
+        self.multiplier = multiplier
+        self.max_catch_up = max_catch_up
+        self.next_tick = None
+
+    def set_mode(self, mode: int):
+        self.mode = mode
+        self.next_tick = None
+
+    def get_tick_interval(self) -> float:
+        if self.mode == PacingMode.UNTHROTTLED:
+            return 0.0
+        if self.mode == PacingMode.MULTIPLIER:
+            return 1.0 / (self.tick_rate * self.multiplier)
+
+        return 1.0 / self.tick_rate
+
+    def wait(self):
+        # Called once per tick by a loop that ticks on its own, like Environment.step.
+        # Sleeps until the tick after the previous call is due.
+        interval = self.get_tick_interval()
+        if interval == 0:
+            return
+
+        now = time.perf_counter()
+        if self.next_tick is None or now - self.next_tick > self.max_catch_up * interval:
+            self.next_tick = now
+        elif self.next_tick > now:
+            time.sleep(self.next_tick - now)
+
+        self.next_tick += interval
+
+    def get_due_ticks(self) -> int:
+        # Called once per frame by a loop that draws, like Engine.run: how many ticks to run now.
+        # Unthrottled runs one tick per frame.
+        interval = self.get_tick_interval()
+        if interval == 0:
+            return 1
+
+        now = time.perf_counter()
+        if self.next_tick is None:
+            self.next_tick = now + interval
+            return 0
+
+        due = 0
+        while self.next_tick <= now and due < self.max_catch_up:
+            self.next_tick += interval
+            due += 1
+
+        if self.next_tick <= now:
+            self.next_tick = now + interval
+
+        return due
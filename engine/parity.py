@@ -0,0 +1,92 @@
+import json
+import math
+import os
+import tempfile
+import numpy as np
+from .constants import *
+from .utils import find_exit_point
+from .level import Level
+from .level_file import read_level_file
+
+def stepped_inverted_raycast(level: Level, x, y, z, height, dir_x, dir_y, dir_z, distance):
+    # The original recursive ground ray, kept as the reference for Level.inverted_raycast
+    if distance > MAX_RAYCAST_DISTANCE:
+        return False, MAX_RAYCAST_DISTANCE
+
+    block = level.get_block_at(x, y, z, height)
+
+    if block is None:
+        return True, distance
+
+    for bbox in block.get_bounding_box():
+        exit_point = find_exit_point(x, y, z, dir_x, dir_y, dir_z, bbox)
+        if exit_point is None:
+            continue
+
+        next_x = exit_point[0] + dir_x * INVERTED_RAYCAST_STEP
+        next_y = exit_point[1] + dir_y * INVERTED_RAYCAST_STEP
+        next_z = exit_point[2] + dir_z * INVERTED_RAYCAST_STEP
+
+        return stepped_inverted_raycast(level, next_x, next_y, next_z, height, dir_x, dir_y, dir_z, distance + exit_point[3])
+
+    return False, 0
+
+def check_inverted_raycast(level: Level, samples: int = 2000, tolerance: float = 1e-3, seed: int = 0):
+    # Every cell crossing of the stepped ray loses INVERTED_RAYCAST_STEP, hence the tolerance
+    rng = np.random.default_rng(seed)
+    cells = np.array([(block.x, block.y, block.z) for block in level.blocks], dtype=np.float64)
+    low = cells.min(axis=0) - 1.5
+    high = cells.max(axis=0) + 2.5
+    heights = np.unique(cells[:, 1]) + 1
+
+    failures = []
+    max_error = 0.0
+
+    for _ in range(samples):
+        x = rng.uniform(low[0], high[0])
+        z = rng.uniform(low[2], high[2])
+        y = rng.choice(heights) - 1.25
+
+        for i in range(RAYCAST_NUMBER):
+            angle = (i / RAYCAST_NUMBER) * 2 * math.pi
+            dir_x = math.cos(angle)
+            dir_z = math.sin(angle)
+
+            expected = stepped_inverted_raycast(level, x, y, z, 1.25, dir_x, 0, dir_z, 0)
+            result = level.inverted_raycast(x, y, z, 1.25, dir_x, 0, dir_z, 0)
+            error = abs(expected[1] - result[1])
+            max_error = max(max_error, error)
+
+            if expected[0] != result[0] or error > tolerance:
+                failures.append((x, y, z, angle, expected, result))
+
+    return failures, max_error
+
+def make_shifted_level(path: str, offset_x: int, offset_z: int, directory: str) -> Level:
+    # The level at path moved by whole cells and saved in directory, so the rays can be
+    # checked on one that crosses into negative coordinates
+    source = read_level_file(path)
+    min_x, max_x, min_y, max_y, min_z, max_z = source["start_bounds"]
+    source["start_bounds"] = [min_x + offset_x, max_x + offset_x, min_y, max_y, min_z + offset_z, max_z + offset_z]
+    source["goal"] = [source["goal"][0] + offset_x, source["goal"][1], source["goal"][2] + offset_z]
+    for block in source["blocks"]:
+        block["x"] += offset_x
+        block["z"] += offset_z
+
+    shifted_path = os.path.join(directory, os.path.basename(path))
+    with open(shifted_path, "w") as f:
+        json.dump(source, f)
+
+    return Level(shifted_path)
+
+if __name__ == "__main__":
+    import pygame
+    pygame.init()
+
+    level = Level()
+    failures, max_error = check_inverted_raycast(level)
+    print(f"Inverted raycast: {len(failures)} rays outside tolerance, max error {max_error:.6f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        failures, max_error = check_inverted_raycast(make_shifted_level(level.path, -4, -4, directory))
+        print(f"Inverted raycast, level moved by (-4, -4): {len(failures)} rays outside tolerance, max error {max_error:.6f}")
@@ -1,12 +1,28 @@
+from __future__ import annotations
 import math
-import pygame
+from .lazy import pygame
 from .constants import *
 from .camera import Camera
 from numpy import float32 as fl
 from .utils import *
+from .mcmath import f32, sin_float, cos_float
 from .bounding_box import BoundingBox
 from .blocks.block import Block
 from .level import Level
+from .broadphase import Broadphase
+from .render_cache import render_cache
+from .macro import MacroRecorder
+
+# Float32 constants of Player.move as plain Python floats, see mcmath.f32
+FRICTION = f32(0.91)
+AIR_MOVEMENT = f32(0.02)
+AIR_SPRINT_MOVEMENT = f32(AIR_MOVEMENT + f32(AIR_MOVEMENT * f32(0.3)))
+GROUND_MOVEMENT = f32(0.1)
+GROUND_SPRINT_MOVEMENT = f32(GROUND_MOVEMENT * f32(1.0 + f32(0.3)))
+GROUND_MOVEMENT_FACTOR = f32(0.16277136)
+INPUT_DECAY = f32(0.98)
+MIN_INPUT_DISTANCE = f32(0.0001)
+PI_F32 = f32(PI)
 
 class Player:
     start_x = 0.5
@@ -45,12 +61,15 @@ class Player:
         self.jump_angle = 0
         self.jump_height = y
         self.is_colliding = False
+        self.broadphase = Broadphase()
         
         self.prev_x = 0.0
         self.prev_y = 0.0
         self.prev_z = 0.0
         
-        self.macro = []
+        # With recording_macro False nothing is recorded, for ticks whose macro is never saved
+        self.macro = MacroRecorder()
+        self.recording_macro = RECORD_MACROS
         self.keys = {
             'W': False, 'A': False, 'S': False, 'D': False, 
             'sprint': False, 'sneak': False, 'space': False,
@@ -61,16 +80,8 @@ class Player:
         screen_x, screen_z = camera.world_to_screen(fl(self.x), fl(self.z))
         size = BLOCK_SIZE * PLAYER_SIZE
     
-        total_rotation_degrees = math.degrees(camera.rotation)
-        
-        player_surface = pygame.Surface((size, size), pygame.SRCALPHA)
-        
-        if self.airborne:
-            pygame.draw.rect(player_surface, PLAYER_AIRBORNE_COLOR, (0, 0, size, size))
-        else:
-            pygame.draw.rect(player_surface, PLAYER_GROUNDED_COLOR, (0, 0, size, size))
-        
-        rotated_surface = pygame.transform.rotate(player_surface, -total_rotation_degrees)
+        color = PLAYER_AIRBORNE_COLOR if self.airborne else PLAYER_GROUNDED_COLOR
+        rotated_surface = render_cache.get_player_sprite(size, color, camera.rotation)
         
         rotated_rect = rotated_surface.get_rect(center=(screen_x, screen_z))
         
@@ -93,10 +104,17 @@ class Player:
         self.prev_y = self.y
         self.prev_z = self.z
 
+        half_size = PLAYER_SIZE / 2
+
+        # The three passes below only query boxes inside the volume swept this tick
+        self.broadphase.prepare(level, self.x - half_size + min(self.vx, 0), self.x + half_size + max(self.vx, 0),
+                                self.y + min(self.vy, 0), self.y + PLAYER_HEIGHT + max(self.vy, 0),
+                                self.z - half_size + min(self.vz, 0), self.z + half_size + max(self.vz, 0))
+
         # Y collision detection
-        next_position = self.get_bounding_box()
-        next_position.move(y = self.vy)
-        bbox = level.check_collision(next_position)
+        bbox = self.broadphase.check_collision_at(level, self.x - half_size, self.x + half_size,
+                                                  self.y + self.vy, self.y + PLAYER_HEIGHT + self.vy,
+                                                  self.z - half_size, self.z + half_size)
         if bbox is not None:
             if self.vy > 0:
                 self.y = bbox.min_y - PLAYER_SIZE / 2
@@ -110,9 +128,9 @@ class Player:
             airborne = True
         
         # X collision detection
-        next_position = self.get_bounding_box()
-        next_position.move(x = self.vx)
-        bbox = level.check_collision(next_position)
+        bbox = self.broadphase.check_collision_at(level, self.x - half_size + self.vx, self.x + half_size + self.vx,
+                                                  self.y, self.y + PLAYER_HEIGHT,
+                                                  self.z - half_size, self.z + half_size)
         if bbox is not None:
             if self.vx > 0:
                 self.x = bbox.min_x - PLAYER_SIZE / 2 - COLLISION_HITBOX_GROWTH
@@ -125,9 +143,9 @@ class Player:
             self.x += self.vx
             
         # Z collision detection
-        next_position = self.get_bounding_box()
-        next_position.move(z = self.vz)
-        bbox = level.check_collision(next_position)
+        bbox = self.broadphase.check_collision_at(level, self.x - half_size, self.x + half_size,
+                                                  self.y, self.y + PLAYER_HEIGHT,
+                                                  self.z - half_size + self.vz, self.z + half_size + self.vz)
         if bbox is not None:
             if self.vz > 0:
                 self.z = bbox.min_z - PLAYER_SIZE / 2 - COLLISION_HITBOX_GROWTH
@@ -151,8 +169,9 @@ class Player:
             self.prev_slip = slip
 
         # Finalizing momentum
-        self.vx *= float(fl(0.91) * self.prev_slip)
-        self.vz *= float(fl(0.91) * self.prev_slip)
+        friction = f32(FRICTION * f32(self.prev_slip))
+        self.vx *= friction
+        self.vz *= friction
         
         jumping = self.jumping
         if airborne:
@@ -181,42 +200,43 @@ class Player:
 
         # Calculating movement multiplier
         if airborne:
-            movement = fl(0.02)
+            movement = AIR_MOVEMENT
             if (self.air_sprint_delay and self.prev_sprint) or (not self.air_sprint_delay and self.sprinting):
-                movement = fl(movement + movement * 0.3)
+                movement = AIR_SPRINT_MOVEMENT
         else:
-            movement = fl(0.1)
+            movement = GROUND_MOVEMENT
             
             if self.sprinting:
-                movement = fl(movement * (1.0 + fl(0.3)))
-            drag = fl(0.91) * slip
-            movement *= fl(0.16277136) / (drag * drag * drag)
+                movement = GROUND_SPRINT_MOVEMENT
+            drag = f32(FRICTION * f32(slip))
+            movement = f32(movement * f32(GROUND_MOVEMENT_FACTOR / f32(f32(drag * drag) * drag)))
 
         # Applying sneaking
-        forward = self.forward
-        strafe = self.strafe
+        forward = float(self.forward)
+        strafe = float(self.strafe)
         if self.sneaking:
-            forward = fl(float(self.forward) * 0.3)
-            strafe = fl(float(self.strafe) * 0.3)
+            forward = f32(forward * 0.3)
+            strafe = f32(strafe * 0.3)
         
-        forward *= fl(0.98)
-        strafe *= fl(0.98)
+        forward = f32(forward * INPUT_DECAY)
+        strafe = f32(strafe * INPUT_DECAY)
 
-        distance = fl(strafe * strafe + forward * forward)
+        distance = f32(f32(strafe * strafe) + f32(forward * forward))
 
-        if distance >= fl(0.0001):
-            distance = fl(math.sqrt(float(distance)))
-            if distance < fl(1.0):
-                distance = fl(1.0)
+        if distance >= MIN_INPUT_DISTANCE:
+            distance = f32(math.sqrt(distance))
+            if distance < 1.0:
+                distance = 1.0
 
-            distance = movement / distance
-            forward = forward * distance
-            strafe = strafe * distance
+            distance = f32(movement / distance)
+            forward = f32(forward * distance)
+            strafe = f32(strafe * distance)
 
-            sin_yaw = fl(mcsin(self.facing * fl(PI) / fl(180.0)))
-            cos_yaw = fl(mccos(self.facing * fl(PI) / fl(180.0)))
-            self.vx += float(strafe * cos_yaw - forward * sin_yaw)
-            self.vz += float(forward * cos_yaw + strafe * sin_yaw)
+            yaw = f32(f32(f32(self.facing) * PI_F32) / 180.0)
+            sin_yaw = sin_float(yaw)
+            cos_yaw = cos_float(yaw)
+            self.vx += f32(f32(strafe * cos_yaw) - f32(forward * sin_yaw))
+            self.vz += f32(f32(forward * cos_yaw) + f32(strafe * sin_yaw))
 
         self.prev_sprint = self.sprinting
         self.prev_slip = slip
@@ -234,33 +254,11 @@ class Player:
             
         self.prev_facing = self.facing
         
-        # Format the data line as a list of strings
-        data_line = [
-            "0.0",
-            "0.0",
-            "0.0",
-            "0.0",
-            "0.0",
-            f"{pitch:.2f}",
-            "0.0",
-            str(self.keys['W']).lower(),
-            str(self.keys['A']).lower(),
-            str(self.keys['S']).lower(),
-            str(self.keys['D']).lower(),
-            str(self.keys['sprint']).lower(),
-            str(self.keys['sneak']).lower(),
-            str(self.keys['space']).lower(),
-            "false",
-            "false",
-            f"0.0",
-            f"0.0",
-            f"0.0"
-        ]
-        
-        self.macro.append(data_line)
+        if self.recording_macro:
+            self.macro.record(pitch, self.keys)
     
     def reset_macro(self):
-        self.macro = []
+        self.macro.reset()
     
     def get_info_text(self):
         return [
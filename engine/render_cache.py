@@ -0,0 +1,67 @@
+from __future__ import annotations
+import math
+from collections import OrderedDict
+from .lazy import pygame
+from .constants import *
+
+class RenderCache:
+    # Fonts, rendered text and player sprites reused across frames. Text and sprites are keyed
+    # by what they show and dropped least recently used first beyond max_entries; fonts are few
+    # and kept for good.
+    def __init__(self, max_entries: int = RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def get_font(self, name: str, size: int, system: bool = True) -> pygame.font.Font:
+        # name None is pygame's default font, otherwise a system font unless system is False
+        key = (name, size, system)
+        font = self.fonts.get(key)
+        if font is None:
+            if name is not None and system:
+                font = pygame.font.SysFont(name, size)
+            else:
+                font = pygame.font.Font(name, size)
+            self.fonts[key] = font
+
+        return font
+
+    def get_surface(self, key: tuple, create) -> pygame.Surface:
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = create()
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+    def render_text(self, font: pygame.font.Font, text: str, color: tuple) -> pygame.Surface:
+        return self.get_surface(("text", font, text, color), lambda: font.render(text, True, color))
+
+    def get_key_surface(self, font: pygame.font.Font, label: str, width: int, height: int, color: tuple, text_color: tuple) -> pygame.Surface:
+        # A keystroke overlay key: filled rectangle with its label centered
+        def create():
+            surface = pygame.Surface((width, height))
+            surface.fill(color)
+            text_surface = font.render(label, True, text_color)
+            surface.blit(text_surface, text_surface.get_rect(center=(width / 2, height / 2)))
+            return surface
+
+        return self.get_surface(("key", font, label, width, height, color, text_color), create)
+
+    def get_player_sprite(self, size: float, color: tuple, rotation: float) -> pygame.Surface:
+        # The player square rotated by the camera rotation in radians, as Player.draw rendered it
+        degrees = math.degrees(rotation)
+
+        def create():
+            player_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.rect(player_surface, color, (0, 0, size, size))
+            return pygame.transform.rotate(player_surface, -degrees)
+
+        return self.get_surface(("player", size, color, degrees), create)
+
+render_cache = RenderCache()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import sys
+import numpy as np
+from .lazy import shared_memory, resource_tracker
+from .constants import *
+
+SPECTATOR_KEYS = ['W', 'A', 'S', 'D', 'space', 'sprint']
+SPECTATOR_INFO_LINES = 4
+
+# Ring buffer layout: one header record, then SPECTATOR_RING_SIZE frame records
+HEADER_DTYPE = np.dtype([
+    ("slots", np.int64),
+    ("count", np.int64),
+    ("level_path", "S256"),
+])
+
+FRAME_DTYPE = np.dtype([
+    ("index", np.int64),
+    ("position", np.float64, 3),
+    ("velocity", np.float64, 3),
+    ("facing", np.float32),
+    ("jump_angle", np.float64),
+    ("airborne", bool),
+    ("keys", bool, len(SPECTATOR_KEYS)),
+    ("info", "S64", SPECTATOR_INFO_LINES),
+])
+
+def get_spectator_name(worker: int) -> str:
+    return f"{SPECTATOR_NAME}_{worker}"
+
+def map_ring(memory: shared_memory.SharedMemory, slots: int):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=memory.buf)
+    frames = np.ndarray((slots,), dtype=FRAME_DTYPE, buffer=memory.buf, offset=HEADER_DTYPE.itemsize)
+    return header, frames
+
+class SpectatorPublisher:
+    # Writes one frame of player and HUD state per call into a shared-memory ring. Writing never
+    # waits on a reader: a slow viewer just skips frames that were overwritten in the meantime.
+    def __init__(self, name: str, level_path: str, slots: int = SPECTATOR_RING_SIZE):
+        size = HEADER_DTYPE.itemsize + slots * FRAME_DTYPE.itemsize
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a worker that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.header, self.frames = map_ring(self.memory, slots)
+        self.header["slots"] = slots
+        self.header["count"] = 0
+        self.header["level_path"] = level_path.encode()[:256]
+        self.count = 0
+
+    def publish(self, player, active_keys: dict = {}, ai_info: list = []):
+        self.publish_state((player.x, player.y, player.z), (player.vx, player.vy, player.vz), player.facing,
+                           player.jump_angle, player.airborne, active_keys, ai_info)
+
+    def publish_state(self, position: tuple, velocity: tuple, facing: float, jump_angle: float, airborne: bool,
+                      active_keys: dict = {}, ai_info: list = []):
+        # publish for callers without a Player, like BatchedEnvironment's array-backed players
+        frame = self.frames[self.count % len(self.frames)]
+
+        # The index is cleared while the slot is written, so a reader copying it at the same time
+        # sees a mismatch and retries
+        frame["index"] = -1
+        frame["position"] = position
+        frame["velocity"] = velocity
+        frame["facing"] = facing
+        frame["jump_angle"] = jump_angle
+        frame["airborne"] = airborne
+        frame["keys"] = [bool(active_keys.get(key, False)) for key in SPECTATOR_KEYS]
+        frame["info"] = [line.encode()[:64] for line in ai_info[:SPECTATOR_INFO_LINES]] + [b""] * max(SPECTATOR_INFO_LINES - len(ai_info), 0)
+        frame["index"] = self.count
+
+        self.count += 1
+        self.header["count"] = self.count
+
+    def close(self):
+        self.header = None
+        self.frames = None
+        self.memory.close()
+        self.memory.unlink()
+
+def attach_memory(name: str) -> shared_memory.SharedMemory:
+    # Attaching must not register the segment with this process's resource tracker, which would
+    # unlink it from under the publisher when this process exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+class SpectatorReader:
+    # Attaches to a publisher's ring by name; read returns a copy of the newest complete frame
+    def __init__(self, name: str):
+        self.memory = attach_memory(name)
+        slots = int(np.ndarray((), dtype=HEADER_DTYPE, buffer=self.memory.buf)["slots"])
+        self.header, self.frames = map_ring(self.memory, slots)
+        self.level_path = self.header["level_path"].item().decode()
+
+    def read(self):
+        for _ in range(3):
+            count = int(self.header["count"])
+            if count == 0:
+                return None
+
+            frame = self.frames[(count - 1) % len(self.frames)].copy()
+            if frame["index"] == count - 1:
+                return frame
+
+        return None
+
+    def close(self):
+        self.header = None
+        self.frames = None
+        self.memory.close()
+
+def run_viewer(worker: int = 0):
+    # Renders a worker's published frames at SPECTATOR_FPS. Number keys switch between workers.
+    import pygame
+    from .engine import Engine
+    from .level import Level
+
+    engine = Engine()
+    engine.do_draw = True
+    reader = None
+
+    while engine.running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                engine.running = False
+            elif event.type == pygame.KEYDOWN and pygame.K_0 <= event.key <= pygame.K_9:
+                worker = event.key - pygame.K_0
+                if reader is not None:
+                    reader.close()
+                    reader = None
+
+        if reader is None:
+            try:
+                reader = SpectatorReader(get_spectator_name(worker))
+            except FileNotFoundError:
+                pygame.display.set_caption(f"Vector Engine - waiting for worker {worker}")
+                engine.clock.tick(SPECTATOR_FPS)
+                continue
+
+            pygame.display.set_caption(f"Vector Engine - worker {worker}")
+            if reader.level_path != engine.level.path:
+                engine.level = Level(reader.level_path)
+
+        frame = reader.read()
+        if frame is not None:
+            player = engine.player
+            player.x, player.y, player.z = frame["position"].tolist()
+            player.vx, player.vy, player.vz = frame["velocity"].tolist()
+            player.facing = frame["facing"]
+            player.jump_angle = float(frame["jump_angle"])
+            player.airborne = bool(frame["airborne"])
+            keys = dict(zip(SPECTATOR_KEYS, frame["keys"].tolist()))
+            info = [line.decode() for line in frame["info"].tolist() if line]
+            engine.draw(keys, info)
+
+        engine.clock.tick(SPECTATOR_FPS)
+        engine.fps = int(engine.clock.get_fps())
+
+    if reader is not None:
+        reader.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    run_viewer(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
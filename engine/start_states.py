@@ -0,0 +1,172 @@
+import numpy as np
+from .constants import *
+from .level import Level
+from .player import Player
+from .batched_player import BatchedPlayerSim
+from numpy import float32 as fl
+
+START_STATE_DTYPE = np.dtype([
+    ("position", np.float64, 3),
+    ("facing", np.float32),
+    ("velocity", np.float64, 3),
+    # What the first tick after a reset reads from the tick before: friction, air sprint and
+    # the height GROUND_DISTANCE is measured from
+    ("prev_slip", np.float32),
+    ("prev_sprint", bool),
+    ("jump_height", np.float64),
+])
+
+# Sampling rounds before giving up on start bounds that hold no valid state
+MAX_GENERATE_ROUNDS = 64
+
+def take_snapshot(sim: BatchedPlayerSim) -> np.ndarray:
+    # Every player of sim as a START_STATE_DTYPE record
+    snapshot = np.zeros(sim.num_players, dtype=START_STATE_DTYPE)
+    snapshot["position"] = np.stack([sim.x, sim.y, sim.z], axis=1)
+    snapshot["facing"] = sim.facing
+    snapshot["velocity"] = np.stack([sim.vx, sim.vy, sim.vz], axis=1)
+    snapshot["prev_slip"] = sim.prev_slip
+    snapshot["prev_sprint"] = sim.prev_sprint
+    snapshot["jump_height"] = sim.jump_height
+    return snapshot
+
+class StartStatePool:
+    # Spawn states inside the level's start bounds, simulated once up front so that a reset only
+    # takes the next state. Every state stands on ground: it is settled with one idle tick, then
+    # sprints forward for a random 0..momentum_ticks ticks without leaving the bounds or the
+    # ground. Facing is spread uniformly within facing_spread degrees of Player.start_f. The pool
+    # is handed out in a shuffled order that is reshuffled once it runs out.
+    def __init__(self, level: Level, size: int = START_STATE_POOL_SIZE, momentum_ticks: int = START_MOMENTUM_TICKS,
+                 facing_spread: float = START_FACING_SPREAD, seed: int = None, states: np.ndarray = None):
+        # states, when given, are handed out as they are instead of generating the pool
+        self.rng = np.random.default_rng(seed)
+        self.states = states if states is not None else self.generate(level, size, momentum_ticks, facing_spread)
+        self.reshuffle()
+
+    def generate(self, level: Level, size: int, momentum_ticks: int, facing_spread: float) -> np.ndarray:
+        bounds = level.get_start_bounds()
+        states = np.zeros(size, dtype=START_STATE_DTYPE)
+        count = 0
+
+        for _ in range(MAX_GENERATE_ROUNDS):
+            x = self.rng.uniform(bounds.min_x, bounds.max_x, size)
+            y = np.full(size, float(bounds.min_y))
+            z = self.rng.uniform(bounds.min_z, bounds.max_z, size)
+            facing = (Player.start_f + self.rng.uniform(-facing_spread, facing_spread, size)).astype(fl)
+            run_up = self.rng.integers(0, momentum_ticks + 1, size)
+
+            sim = BatchedPlayerSim(level, size)
+            sim.set_position(x, y, z, facing)
+            snapshot = np.zeros(size, dtype=START_STATE_DTYPE)
+            valid = np.zeros(size, dtype=bool)
+            running = np.zeros(size, dtype=bool)
+            standing = np.ones(size, dtype=bool)
+
+            for tick in range(momentum_ticks + 1):
+                sim.set_movement(running, False, False, False, running, False)
+                sim.tick()
+
+                standing &= ~sim.airborne & (sim.x >= bounds.min_x) & (sim.x <= bounds.max_x) & \
+                            (sim.z >= bounds.min_z) & (sim.z <= bounds.max_z)
+                taken = run_up == tick
+                snapshot[taken] = take_snapshot(sim)[taken]
+                valid[taken] = standing[taken]
+                running = run_up > tick
+
+            found = snapshot[valid][:size - count]
+            states[count:count + len(found)] = found
+            count += len(found)
+            if count == size:
+                return states
+
+        raise ValueError(f"Found only {count} of {size} start states standing inside the start bounds")
+
+    def reshuffle(self):
+        self.order = self.rng.permutation(len(self.states))
+        self.cursor = 0
+
+    def sample(self) -> np.void:
+        if self.cursor == len(self.order):
+            self.reshuffle()
+
+        state = self.states[self.order[self.cursor]]
+        self.cursor += 1
+        return state
+
+    def sample_batch(self, count: int) -> np.ndarray:
+        parts = []
+        while count > 0:
+            if self.cursor == len(self.order):
+                self.reshuffle()
+
+            take = min(count, len(self.order) - self.cursor)
+            parts.append(self.order[self.cursor:self.cursor + take])
+            self.cursor += take
+            count -= take
+
+        return self.states[np.concatenate(parts)] if parts else self.states[:0]
+
+def check_start_states(level: Level = None, size: int = 256, momentum_ticks: int = 10, seed: int = 0) -> list[str]:
+    # A pooled state has to carry on the run-up it was taken from: the tick after Engine.reset or
+    # BatchedEnvironment.reset_envs into it must equal the tick its own simulation ran next. Both
+    # reset over a player left in the air, so nothing may carry over from the last episode.
+    # Returns the fields that differ in either path.
+    from .engine import Engine
+    from brain.batched_environment import BatchedEnvironment
+
+    level = level if level is not None else Level()
+    rng = np.random.default_rng(seed)
+    bounds = level.get_start_bounds()
+    sim = BatchedPlayerSim(level, size)
+    sim.set_position(rng.uniform(bounds.min_x, bounds.max_x, size), float(bounds.min_y),
+                     rng.uniform(bounds.min_z, bounds.max_z, size), Player.start_f)
+
+    running = np.ones(size, dtype=bool)
+    sim.set_movement(~running, False, False, False, ~running, False)
+    sim.tick()
+    for _ in range(rng.integers(1, momentum_ticks + 1)):
+        sim.set_movement(running, False, False, False, running, False)
+        sim.tick()
+
+    states = take_snapshot(sim)
+    sim.tick()
+    expected = take_snapshot(sim)
+
+    engine = Engine(headless=True)
+    player = engine.player
+    keys = {'W': True, 'A': False, 'S': False, 'D': False, 'sprint': True, 'space': False}
+    results = np.zeros(size, dtype=START_STATE_DTYPE)
+    for i, state in enumerate(states):
+        player.prev_slip, player.prev_sprint, player.jump_height = 1.0, False, player.y + 5.0
+        engine.reset(state)
+        engine.apply_player_input(keys, 0.0)
+        engine.tick()
+        results[i] = (player.get_position(), player.facing, player.get_velocity(),
+                      player.prev_slip, player.prev_sprint, player.jump_height)
+
+    vector_env = BatchedEnvironment(size, level=level, ground_field=False, record_macros=False)
+    vector_env.start_states = StartStatePool(level, states=states, seed=seed)
+    vector_env.sim.prev_slip[:], vector_env.sim.prev_sprint[:] = 1.0, False
+    vector_env.sim.jump_height += 5.0
+    vector_env.reset_envs(np.ones(size, dtype=bool))
+    vector_env.sim.set_movement(running, False, False, False, running, False)
+    vector_env.sim.tick()
+    batched = take_snapshot(vector_env.sim)
+    order = vector_env.start_states.order
+    vector_env.close()
+
+    mismatches = []
+    for name in START_STATE_DTYPE.names:
+        if not np.array_equal(results[name], expected[name]):
+            mismatches.append(f"Environment {name}")
+        if not np.array_equal(batched[name], expected[name][order]):
+            mismatches.append(f"BatchedEnvironment {name}")
+
+    return mismatches
+
+if __name__ == "__main__":
+    mismatches = check_start_states()
+    if mismatches:
+        print(f"Start state continuation failed: {', '.join(mismatches)}")
+    else:
+        print("Start state continuation OK in Environment and BatchedEnvironment")
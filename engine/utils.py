@@ -1,18 +1,17 @@
 import math 
 from .constants import *
+from .mcmath import SIN_VALUES, SIN_SCALE, COS_OFFSET
 from numpy import float32 as fl
 
 def mcsin(rad):
     if ANGLES == 65536:
-        index = int(rad * fl(10430.378)) & 65535
-        return fl(math.sin(index * math.pi * 2.0 / 65536))
+        return SIN_VALUES[int(rad * SIN_SCALE) & 65535]
     else:
         return math.sin(rad)
 
 def mccos(rad):
     if ANGLES == 65536:
-        index = int(rad * fl(10430.378) + fl(16384.0)) & 65535
-        return fl(math.sin(index * math.pi * 2.0 / 65536))
+        return SIN_VALUES[int(rad * SIN_SCALE + COS_OFFSET) & 65535]
     else:
         return math.cos(rad)
     